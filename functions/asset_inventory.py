@@ -0,0 +1,79 @@
+import logging
+import threading
+import time
+
+# Searchable asset types of the Cloud Asset API, keyed to the CKAN resource format they are checked as
+ASSET_TYPES = {
+    "pubsub.googleapis.com/Topic": "topic",
+    "pubsub.googleapis.com/Subscription": "subscription",
+    "storage.googleapis.com/Bucket": "blob-storage",
+    "sqladmin.googleapis.com/Instance": "cloudsql-instance",
+    "bigquery.googleapis.com/Dataset": "bigquery-dataset",
+}
+SERVICE_ASSET_TYPE = "serviceusage.googleapis.com/Service"
+PROJECT_ASSET_TYPE = "cloudresourcemanager.googleapis.com/Project"
+SEARCH_PAGE_SIZE = 500  # Maximum page size of searchAllResources
+
+
+def make_empty_project():
+    project = {resource_format: [] for resource_format in ASSET_TYPES.values()}
+    project["services"] = []
+    return project
+
+
+class AssetInventory(object):
+    # The services and resources of all projects within the scope, fetched with a few searches of the Cloud Asset API
+    # instead of listing every resource type per project
+
+    def __init__(self, asset_client, rate_limiter, scope):
+        self.asset_client = asset_client
+        self.rate_limiter = rate_limiter
+        # e.g. 'organizations/123456789012'
+        self.scope = scope
+        self.projects = None
+        self.lock = threading.Lock()
+
+    def search(self, asset_types):
+        resources = self.asset_client.v1()
+        request = resources.searchAllResources(
+            scope=self.scope, assetTypes=asset_types, pageSize=SEARCH_PAGE_SIZE
+        )
+        while request is not None:
+            response = self.rate_limiter.call("cloudasset", request.execute)
+            for result in response.get("results", []):
+                yield result
+            request = resources.searchAllResources_next(request, response)
+
+    def load(self):
+        # Resources refer to their project by number, Project assets map these to project IDs
+        project_ids = {}
+        for result in self.search([PROJECT_ASSET_TYPE]):
+            project_number = result["name"].split("/")[-1]
+            project_ids[f"projects/{project_number}"] = result.get("additionalAttributes", {}).get(
+                "projectId", result.get("displayName")
+            )
+        projects = {project_id: make_empty_project() for project_id in project_ids.values()}
+        for result in self.search([SERVICE_ASSET_TYPE] + list(ASSET_TYPES)):
+            project_id = project_ids.get(result.get("project"))
+            if project_id is None:
+                continue
+            # Only the short name is compared, like the listings of the other backend
+            name = result["name"].split("/")[-1]
+            if result["assetType"] == SERVICE_ASSET_TYPE:
+                if result.get("state", "ENABLED") == "ENABLED":
+                    projects[project_id]["services"].append(name)
+            else:
+                projects[project_id][ASSET_TYPES[result["assetType"]]].append(name)
+        return projects
+
+    def get_project(self, project_id):
+        # Returns None when the project does not exist within the scope
+        with self.lock:
+            if self.projects is None:
+                started = time.monotonic()
+                self.projects = self.load()
+                logging.info(
+                    f"Loaded asset inventory of {len(self.projects)} projects in "
+                    f"{time.monotonic() - started:.3f} seconds"
+                )
+        return self.projects.get(project_id)
@@ -1,98 +1,238 @@
 import logging
+import time
 
 import config
 from ckan_service import CKANService
 from gcp_helper import GCPHelper
 from gcp_service import GCPService
 from gobits import Gobits
-from not_found_resource import NotFoundResource
-from package import Package
+from rate_limiter import QuotaExhausted
+from reconciliation import ReconciliationEngine
+from resource_filter import ResourceFilter
+from run_ledger import RunLedger
+from scan_checkpoint import ScanCheckpoint
+from scan_report import ScanReport
+from sharding import ShardedRun
+from state_store import get_state_store
 
 
 class CKANProcessor(object):
-    def __init__(self):
-        self.gcp_helper = GCPHelper()
-        self.gcp_service = GCPService()
-        self.ckan_service = CKANService()
+    def __init__(self, gcp_helper=None, gcp_service=None, ckan_service=None):
+        # Services can be passed in, e.g. the fakes of the benchmark
+        self.gcp_helper = gcp_helper or GCPHelper()
+        self.gcp_service = gcp_service or GCPService(ScanReport())
+        self.scan_report = self.gcp_service.scan_report
+        self.ckan_service = ckan_service or CKANService()
+        self.engine = ReconciliationEngine(
+            self.gcp_service, self.ckan_service, self.scan_report, ResourceFilter.from_config()
+        )
+        self.run_ledger = None
+        # The bidirectional check also reports the GCP resources that are not documented on CKAN
+        self.bidirectional = getattr(config, "BIDIRECTIONAL_CHECK", False)
+        self.reverse_project_ids = set()
+        self.reverse_not_found_resources = []
 
     def process(self, request):
-        not_found_resources = []
+        # Scans that run out of time are checkpointed and resumed by the next run
+        deadline = time.monotonic() + getattr(config, "SCAN_DEADLINE_SECONDS", 480)
         if not self.ckan_service.is_ckan_reachable():
             return False
+        checkpoint = None
+        if getattr(config, "CHECKPOINT_SCAN", False):
+            checkpoint = ScanCheckpoint(get_state_store())
+        if getattr(config, "INCREMENTAL_CHECK", False):
+            self.run_ledger = RunLedger(get_state_store())
+        # Incremental runs only recheck what changed, unless a full sweep is due
+        full_sweep = self.run_ledger is None or self.run_ledger.is_full_sweep_due()
+        if checkpoint and checkpoint.full_sweep is not None:
+            full_sweep = checkpoint.full_sweep
+        if self.run_ledger:
+            logging.info(f"Running {'full sweep' if full_sweep else 'incremental check'}")
         # Get all groups of CKAN, they are based on GCP project IDs
         group_list = self.ckan_service.get_group_list()
+        gcp_project_ids = []
+        if self.bidirectional:
+            # The reverse direction is checked for the GCP projects of the environment that have a group
+            gcp_project_ids = list(self.gcp_service.get_projects())
+            self.reverse_project_ids = set(gcp_project_ids) & set(group_list)
+        not_found_resources = []
+        projects_to_check = group_list
+        if checkpoint:
+            not_found_resources = checkpoint.not_found_resources
+            self.reverse_not_found_resources = checkpoint.reverse_not_found_resources
+            projects_to_check = checkpoint.get_remaining_projects(group_list)
         # For every group
-        for group_project_id in group_list:
-            not_found_resource = NotFoundResource(group_project_id)
-            # Get project's services
-            gcp_services = self.gcp_service.get_project_services(group_project_id)
-            # If no gcp_services where found, the project does not exist
-            if not gcp_services:
-                logging.info(
-                    f"Project ID {group_project_id} could not be found on GCP while getting services"
+        for index, group_project_id in enumerate(projects_to_check):
+            # At least one project is checked every run so the scan always makes progress
+            if checkpoint and index > 0 and time.monotonic() >= deadline:
+                logging.warning(
+                    f"Scan deadline reached, {len(projects_to_check) - index} projects left for the next run"
                 )
-                resource_url = f"https://console.cloud.google.com/home/dashboard?project={group_project_id}"
-                not_found_resources.append(
-                    not_found_resource.make_not_found(
-                        "Project not found",
-                        "google-cloud-project",
-                        group_project_id,
-                        "GCP Project",
-                        resource_url,
-                    )
+                checkpoint.save(not_found_resources, full_sweep, self.reverse_not_found_resources)
+                self.gcp_service.close()
+                self.scan_report.emit()
+                if self.run_ledger:
+                    self.run_ledger.save(False, group_list)
+                return True
+            try:
+                project_not_found_resources = self.process_project(group_project_id, full_sweep)
+            except QuotaExhausted as e:
+                # Reporting the project as empty would result in false findings
+                logging.error(f"Project ID {group_project_id} is skipped: {e}")
+                continue
+            not_found_resources.extend(project_not_found_resources)
+            if checkpoint:
+                checkpoint.complete_project(
+                    group_project_id, not_found_resources, full_sweep, self.reverse_not_found_resources
                 )
-            group = self.ckan_service.get_project_group(group_project_id)
-            # Get topics belonging to project ID
-            not_found_resources, topics = self.gcp_service.get_topics(
-                not_found_resource, gcp_services, not_found_resources, group_project_id
-            )
-            # Get subscriptions belonging to project ID
-            not_found_resources, subscriptions = self.gcp_service.get_subscriptions(
-                not_found_resource, gcp_services, not_found_resources, group_project_id
-            )
-            # Get buckets belonging to project ID
-            not_found_resources, buckets = self.gcp_service.get_buckets(
-                not_found_resource, gcp_services, not_found_resources, group_project_id
-            )
-            # Get SQL instances belonging to project ID
-            not_found_resources, sql_instances = self.gcp_service.get_sql_instances(
-                not_found_resource, gcp_services, not_found_resources, group_project_id
-            )
-            # Get SQL databases belonging to project ID
-            not_found_resources, sql_databases = self.gcp_service.get_sql_databases(
-                not_found_resource,
-                gcp_services,
-                sql_instances,
-                not_found_resources,
-                group_project_id,
-            )
-            # Get bigquery datasets belonging to project ID
-            not_found_resources, bigquery_datasets = self.gcp_service.get_bigquery_datasets(
-                not_found_resource, gcp_services, not_found_resources, group_project_id
-            )
-            # For every package in the group
-            for package in group.get("packages", []):
-                full_package = self.ckan_service.get_full_package(package["id"])
-                not_found_resources.extend(
-                    Package(
-                        package=full_package,
-                        topics=topics,
-                        subscriptions=subscriptions,
-                        buckets=buckets,
-                        sql_instances=sql_instances,
-                        sql_databases=sql_databases,
-                        bigquery_datasets=bigquery_datasets,
-                        gcp_services=gcp_services,
-                        group_project_id=group_project_id,
-                    ).process()
-                )
-        self.gcp_service.get_subscriber_client().close()
+        self.gcp_service.close()
+        self.scan_report.emit()
+        if self.run_ledger:
+            self.run_ledger.save(full_sweep, group_list)
 
         # Create gobits object
         metadata = Gobits.from_request(request=request)
 
         # Send issues to a topic
-        return self.gcp_helper.publish_to_topic(
+        published = self.gcp_helper.publish_to_topic(
             config.TOPIC_PROJECT_ID, config.TOPIC_NAME,
             not_found_resources, [metadata.to_json()]
         )
+        if self.bidirectional:
+            published = self.publish_reverse(
+                sorted(set(gcp_project_ids) - set(group_list)), [metadata.to_json()]
+            ) and published
+        if checkpoint:
+            checkpoint.clear()
+        return published
+
+    def publish_reverse(self, mismatching_projects, gobits):
+        # Same report as check-gcp-existence: projects without a group first, then the resources per project
+        reverse_not_found_resources = self.engine.find_projects_missing_on_ckan(mismatching_projects)
+        reverse_not_found_resources.extend(
+            sorted(self.reverse_not_found_resources, key=lambda resource: resource["project_id"])
+        )
+        return self.gcp_helper.publish_to_topic(
+            getattr(config, "REVERSE_TOPIC_PROJECT_ID", config.TOPIC_PROJECT_ID),
+            config.REVERSE_TOPIC_NAME,
+            reverse_not_found_resources,
+            gobits,
+        )
+
+    def coordinate(self, request, shard_queue):
+        if not self.ckan_service.is_ckan_reachable():
+            return False
+        if self.bidirectional:
+            logging.warning(
+                "The bidirectional check is not supported by sharded runs, only CKAN to GCP is checked"
+            )
+        # Get all groups of CKAN, they are based on GCP project IDs
+        group_list = self.ckan_service.get_group_list()
+        # Create gobits object, it is passed on to the shards for the aggregated result
+        metadata = Gobits.from_request(request=request)
+        ShardedRun(get_state_store()).start(
+            group_list,
+            getattr(config, "SHARD_SIZE", 25),
+            shard_queue,
+            [metadata.to_json()],
+        )
+        return True
+
+    def process_shard(self, shard_message):
+        not_found_resources = []
+        # For every group in the shard
+        for group_project_id in shard_message["project_ids"]:
+            try:
+                not_found_resources.extend(self.process_project(group_project_id))
+            except QuotaExhausted as e:
+                # Reporting the project as empty would result in false findings
+                logging.error(f"Project ID {group_project_id} is skipped: {e}")
+        self.gcp_service.close()
+        self.scan_report.emit()
+
+        # The shard that completes the run publishes the findings of all shards
+        merged_not_found_resources = ShardedRun(get_state_store()).finish_shard(
+            shard_message, not_found_resources
+        )
+        if merged_not_found_resources is None:
+            return True
+
+        # Send issues to a topic
+        return self.gcp_helper.publish_to_topic(
+            config.TOPIC_PROJECT_ID, config.TOPIC_NAME,
+            merged_not_found_resources, shard_message["gobits"]
+        )
+
+    def process_project(self, group_project_id, full_sweep=True):
+        # Get project's services, topics, subscriptions, buckets, SQL instances and databases and datasets
+        gcp_side = self.engine.get_gcp_side(group_project_id)
+        ckan_started = time.monotonic()
+        group = self.engine.get_group(group_project_id)
+        check_reverse = group_project_id in self.reverse_project_ids
+        # Packages by ID, every package is fetched at most once even when the project is checked again
+        full_packages = {}
+        not_found_resources, package_results = self.check_project(
+            group_project_id, gcp_side, group, full_packages, full_sweep, check_reverse
+        )
+        if self.engine.has_missing_services(gcp_side, not_found_resources):
+            # Cached services may be older than an API enabled since, so they are fetched again before reporting
+            refreshed_gcp_side = self.engine.refresh_gcp_side(group_project_id)
+            if refreshed_gcp_side is not None:
+                gcp_side = refreshed_gcp_side
+                not_found_resources, package_results = self.check_project(
+                    group_project_id, gcp_side, group, full_packages, full_sweep, check_reverse
+                )
+        if self.run_ledger:
+            self.run_ledger.record_project(
+                group_project_id, self.run_ledger.inventory_hash(gcp_side["services"], gcp_side["inventory"])
+            )
+            for package, package_not_found_resources, reused in package_results:
+                self.run_ledger.record_package(group_project_id, package, package_not_found_resources, reused)
+        ckan_side = self.engine.make_ckan_side(
+            group, list(full_packages.values()), time.monotonic() - ckan_started
+        )
+        if check_reverse:
+            self.reverse_not_found_resources.extend(gcp_side["not_found_resources"])
+            self.reverse_not_found_resources.extend(
+                self.engine.find_missing_on_ckan(group_project_id, gcp_side, ckan_side)
+            )
+        self.engine.record_project(
+            group_project_id,
+            gcp_side,
+            ckan_side,
+            packages=len(full_packages),
+            resources=sum(len(full_package.get("resources", [])) for full_package in full_packages.values()),
+        )
+        return not_found_resources
+
+    def check_project(self, group_project_id, gcp_side, group, full_packages, full_sweep, check_reverse):
+        # Returns the findings of the project and the findings per package, with whether they were reused
+        not_found_resources = self.engine.find_project_missing_on_gcp(group_project_id, gcp_side)
+        not_found_resources.extend(gcp_side["not_found_resources"])
+        inventory_unchanged = False
+        if self.run_ledger:
+            inventory_hash = self.run_ledger.inventory_hash(gcp_side["services"], gcp_side["inventory"])
+            # The reverse direction needs every package, so no findings are reused while it is checked
+            inventory_unchanged = (
+                not full_sweep
+                and not check_reverse
+                and self.run_ledger.is_inventory_unchanged(group_project_id, inventory_hash)
+            )
+        package_results = []
+        # For every package in the group
+        for package in group.get("packages", []):
+            package_not_found_resources = None
+            if inventory_unchanged:
+                package_not_found_resources = self.run_ledger.get_unchanged_package_findings(
+                    group_project_id, package
+                )
+            reused = package_not_found_resources is not None
+            if not reused:
+                if package["id"] not in full_packages:
+                    full_packages[package["id"]] = self.engine.get_full_package(group_project_id, package["id"])
+                package_not_found_resources = self.engine.find_missing_on_gcp(
+                    group_project_id, gcp_side, full_packages[package["id"]]
+                )
+            package_results.append((package, package_not_found_resources, reused))
+            not_found_resources.extend(package_not_found_resources)
+        return not_found_resources, package_results
@@ -0,0 +1,96 @@
+import datetime
+import hashlib
+import json
+import logging
+
+import config
+from not_found_resource import NotFoundResource
+
+LEDGER_NAME = "run_ledger.json"
+
+
+class RunLedger(object):
+    def __init__(self, state_store):
+        self.state_store = state_store
+        self.full_sweep_interval = datetime.timedelta(
+            hours=getattr(config, "FULL_SWEEP_INTERVAL_HOURS", 24)
+        )
+        ledger = self.state_store.load(LEDGER_NAME) or {}
+        self.last_full_sweep = ledger.get("last_full_sweep")
+        self.previous_projects = ledger.get("projects", {})
+        self.projects = {}
+        self.packages_reused = 0
+        self.packages_checked = 0
+
+    def is_full_sweep_due(self):
+        if not self.last_full_sweep:
+            return True
+        last_full_sweep = datetime.datetime.fromisoformat(self.last_full_sweep)
+        return self.now() - last_full_sweep >= self.full_sweep_interval
+
+    @staticmethod
+    def now():
+        return datetime.datetime.now(tz=datetime.timezone.utc)
+
+    @staticmethod
+    def inventory_hash(gcp_services, inventory):
+        # Lists are sorted so the hash only changes when the inventory itself changes
+        # A type that could not be listed is None, which hashes differently from a type without resources
+        canonical = {key: sorted(value) if value is not None else None for key, value in inventory.items()}
+        canonical["services"] = sorted(gcp_services)
+        return hashlib.sha256(
+            json.dumps(canonical, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+
+    def is_inventory_unchanged(self, group_project_id, inventory_hash):
+        previous = self.previous_projects.get(group_project_id)
+        return previous is not None and previous.get("inventory_hash") == inventory_hash
+
+    def get_unchanged_package_findings(self, group_project_id, package):
+        # Returns the findings of the last run if the package was not modified since, otherwise None
+        previous = self.previous_projects.get(group_project_id, {}).get("packages", {})
+        previous_package = previous.get(package["id"])
+        if not previous_package or not package.get("metadata_modified"):
+            return None
+        if previous_package.get("metadata_modified") != package["metadata_modified"]:
+            return None
+        timestamp = NotFoundResource.get_timestamp()
+        return [
+            dict(not_found, timestamp=timestamp)
+            for not_found in previous_package.get("not_found_resources", [])
+        ]
+
+    def record_package(self, group_project_id, package, not_found_resources, reused):
+        if reused:
+            self.packages_reused += 1
+        else:
+            self.packages_checked += 1
+        project = self.projects.setdefault(group_project_id, {"packages": {}})
+        project["packages"][package["id"]] = {
+            "metadata_modified": package.get("metadata_modified"),
+            "not_found_resources": not_found_resources,
+        }
+
+    def record_project(self, group_project_id, inventory_hash):
+        project = self.projects.setdefault(group_project_id, {"packages": {}})
+        project["inventory_hash"] = inventory_hash
+
+    def save(self, full_sweep, group_list):
+        # A full sweep only counts when it was completed
+        if full_sweep:
+            self.last_full_sweep = self.now().isoformat()
+        logging.info(
+            f"Run ledger: {self.packages_checked} packages checked, "
+            f"{self.packages_reused} packages unchanged since the last run"
+        )
+        # Projects not checked in this run (e.g. after a deadline) keep their last entry,
+        # projects no longer in the group list are dropped
+        projects = {}
+        for group_project_id in group_list:
+            project = self.projects.get(group_project_id, self.previous_projects.get(group_project_id))
+            if project is not None:
+                projects[group_project_id] = project
+        self.state_store.save(
+            LEDGER_NAME,
+            {"last_full_sweep": self.last_full_sweep, "projects": projects},
+        )
@@ -0,0 +1,57 @@
+import logging
+
+import config
+
+CHECKPOINT_NAME = "scan_checkpoint.json"
+
+
+class ScanCheckpoint(object):
+    def __init__(self, state_store):
+        self.state_store = state_store
+        self.interval = getattr(config, "CHECKPOINT_INTERVAL", 10)
+        checkpoint = self.state_store.load(CHECKPOINT_NAME) or {}
+        self.completed_project_ids = checkpoint.get("completed_project_ids", [])
+        self.not_found_resources = checkpoint.get("not_found_resources", [])
+        self.reverse_not_found_resources = checkpoint.get("reverse_not_found_resources", [])
+        # Resumed scans keep the mode they were started with
+        self.full_sweep = checkpoint.get("full_sweep")
+        self.projects_since_save = 0
+        if self.completed_project_ids:
+            logging.info(
+                f"Resuming scan from checkpoint, {len(self.completed_project_ids)} projects already checked"
+            )
+
+    def get_remaining_projects(self, group_list):
+        # Projects not checked yet keep their order, so every project is reached within a finite number of runs
+        completed_project_ids = set(self.completed_project_ids)
+        return [
+            group_project_id
+            for group_project_id in group_list
+            if group_project_id not in completed_project_ids
+        ]
+
+    def complete_project(
+            self, group_project_id, not_found_resources, full_sweep, reverse_not_found_resources=None
+    ):
+        self.completed_project_ids.append(group_project_id)
+        self.projects_since_save += 1
+        if self.projects_since_save >= self.interval:
+            self.save(not_found_resources, full_sweep, reverse_not_found_resources)
+
+    def save(self, not_found_resources, full_sweep, reverse_not_found_resources=None):
+        self.projects_since_save = 0
+        self.not_found_resources = not_found_resources
+        self.reverse_not_found_resources = reverse_not_found_resources or []
+        self.full_sweep = full_sweep
+        self.state_store.save(
+            CHECKPOINT_NAME,
+            {
+                "completed_project_ids": self.completed_project_ids,
+                "not_found_resources": self.not_found_resources,
+                "reverse_not_found_resources": self.reverse_not_found_resources,
+                "full_sweep": self.full_sweep,
+            },
+        )
+
+    def clear(self):
+        self.state_store.delete(CHECKPOINT_NAME)
@@ -0,0 +1,102 @@
+import json
+import logging
+import time
+
+import config
+from ckan_index import CKANResourceIndex
+
+INDEX_NAME = "catalog_index.json"
+
+
+class CatalogIndex(object):
+    # The resources of every CKAN package by project, built from one paginated search over the whole catalog
+
+    def __init__(self, projects=None, built_at=None, build_seconds=0.0):
+        # Per project the number of packages and the resources as [name, format, package name]
+        self.projects = projects or {}
+        self.built_at = built_at or time.time()
+        self.build_seconds = build_seconds
+        self.resource_indexes = {}
+
+    @classmethod
+    def build(cls, ckan_service, page_size):
+        started = time.monotonic()
+        catalog_index = cls()
+        start = 0
+        while True:
+            result = ckan_service.search_packages(start, page_size)
+            packages = result.get("results", [])
+            for package in packages:
+                catalog_index.add_package(package)
+            start += len(packages)
+            if not packages or start >= result.get("count", 0):
+                break
+        catalog_index.build_seconds = time.monotonic() - started
+        return catalog_index
+
+    def add_package(self, package):
+        # CKAN groups are based on GCP project IDs
+        resources = [
+            [resource["name"], resource["format"], package.get("name", "")]
+            for resource in package.get("resources", [])
+            if "format" in resource and "name" in resource
+        ]
+        for group in package.get("groups", []):
+            project = self.projects.setdefault(group["name"], {"packages": 0, "resources": []})
+            project["packages"] += 1
+            project["resources"].extend(resources)
+
+    def get_package_count(self, project_id):
+        return self.projects.get(project_id, {}).get("packages", 0)
+
+    def get_resource_count(self, project_id):
+        return len(self.projects.get(project_id, {}).get("resources", []))
+
+    def get_resource_index(self, project_id):
+        # The per project index is only built when the project is checked
+        if project_id not in self.resource_indexes:
+            resource_index = CKANResourceIndex()
+            resources = self.projects.get(project_id, {}).get("resources", [])
+            for name, resource_format, package_name in resources:
+                resource_index.add_package(
+                    {"name": package_name, "resources": [{"name": name, "format": resource_format}]}
+                )
+            self.resource_indexes[project_id] = resource_index
+        return self.resource_indexes[project_id]
+
+    def to_dict(self):
+        return {
+            "built_at": self.built_at,
+            "build_seconds": self.build_seconds,
+            "projects": self.projects,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["projects"], data["built_at"], data.get("build_seconds", 0.0))
+
+    def get_stats(self):
+        return {
+            "build_seconds": round(self.build_seconds, 3),
+            "age_seconds": round(time.time() - self.built_at, 3),
+            "projects": len(self.projects),
+            "packages": sum(project["packages"] for project in self.projects.values()),
+            "resources": sum(len(project["resources"]) for project in self.projects.values()),
+            "size_bytes": len(json.dumps(self.projects)),
+        }
+
+
+def get_catalog_index(ckan_service, state_store):
+    # A cached index is used until it expires, so consecutive runs and shards search the catalog once
+    ttl = getattr(config, "CATALOG_INDEX_TTL_SECONDS", 60 * 60)
+    if ttl > 0:
+        cached_index = state_store.load(INDEX_NAME)
+        if cached_index and time.time() - cached_index["built_at"] < ttl:
+            catalog_index = CatalogIndex.from_dict(cached_index)
+            logging.info(f"Using cached CKAN catalog index: {json.dumps(catalog_index.get_stats())}")
+            return catalog_index
+    catalog_index = CatalogIndex.build(ckan_service, getattr(config, "CATALOG_INDEX_PAGE_SIZE", 1000))
+    logging.info(f"Built CKAN catalog index: {json.dumps(catalog_index.get_stats())}")
+    if ttl > 0:
+        state_store.save(INDEX_NAME, catalog_index.to_dict())
+    return catalog_index
@@ -1,129 +1,72 @@
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 import config
+from catalog_index import get_catalog_index
 from ckan_service import CKANService
 from gcp_helper import GCPHelper
 from gcp_service import GCPService
 from gobits import Gobits
-from not_found_resource import NotFoundResource
+from rate_limiter import QuotaExhausted
+from reconciliation import ReconciliationEngine
+from resource_filter import ResourceFilter
+from scan_report import ScanReport
+from sharding import ShardedRun
+from state_store import get_state_store
 
 
 class GCPProcessor(object):
     def __init__(self):
         self.gcp_helper = GCPHelper()
-        self.gcp_service = GCPService()
+        self.scan_report = ScanReport()
+        self.gcp_service = GCPService(self.scan_report)
         self.ckan_service = CKANService()
+        # The filter of default resources is compiled once for all projects
+        self.resource_filter = ResourceFilter.from_config()
+        self.engine = ReconciliationEngine(
+            self.gcp_service, self.ckan_service, self.scan_report, self.resource_filter
+        )
+
+    def load_catalog_index(self):
+        # The CKAN side of all projects is served from one search over the whole catalog
+        if getattr(config, "CATALOG_INDEX", False):
+            self.engine.catalog_index = get_catalog_index(self.ckan_service, get_state_store())
+            self.scan_report.add_section("catalog_index", self.engine.catalog_index.get_stats())
 
     def process_not_found_projects(self, not_found_projects):
-        not_found_resources = []
-        for project_id in not_found_projects:
-            logging.info(
-                f"Project ID {project_id} could not be found on CKAN while it still exists in GCP"
-            )
-            resource_url = f"https://console.cloud.google.com/home/dashboard?project={project_id}"
-            not_found_resources.append(
-                NotFoundResource(project_id).make_not_found(
-                    "Project not found",
-                    "google-cloud-project",
-                    project_id,
-                    "GCP Project",
-                    resource_url,
-                )
-            )
-        return not_found_resources
+        return self.engine.find_projects_missing_on_ckan(not_found_projects)
 
-    def is_default_resource(self, name):
-        return_value = False
-        for k in config.DEFAULT_RESOURCE_FILTER:
-            if k in name:
-                return_value = True
-                break
-        return return_value
+    def iter_matching_projects(self, mismatching_projects):
+        # get all groups of CKAN, they are based on GCP project IDs
+        group_list = set(self.ckan_service.get_group_list())
+        # GCP projects with a CKAN group are yielded while they are listed, the others are collected
+        for project_id in self.gcp_service.get_projects():
+            if project_id in group_list:
+                yield project_id
+            else:
+                mismatching_projects.append(project_id)
+
+    def get_projects_to_check(self):
+        mismatching_projects = []
+        matching_projects = list(self.iter_matching_projects(mismatching_projects))
+        not_found_resources = self.process_not_found_projects(mismatching_projects)
+        return not_found_resources, matching_projects
 
     def process(self, request):
         if not self.ckan_service.is_ckan_reachable():
             return False
 
-        # get GCP projects
-        project_list = self.gcp_service.get_projects()
-        # get all groups of CKAN, they are based on GCP project IDs
-        group_list = self.ckan_service.get_group_list()
-        # get mismatching projects
-        mismatching_projects = list(set(project_list) - set(group_list))
+        self.load_catalog_index()
+        # Projects are checked as soon as they are discovered
+        mismatching_projects = []
+        project_not_found_resources = self.process_projects(
+            self.iter_matching_projects(mismatching_projects)
+        )
         not_found_resources = self.process_not_found_projects(mismatching_projects)
-        # get matching projects
-        matching_projects = list(set(project_list) - set(mismatching_projects))
-        for project_id in matching_projects:
-            not_found_resource = NotFoundResource(project_id)
-            # Get project's services
-            gcp_services = self.gcp_service.get_project_services(project_id)
-            # Get matching ckan project
-            group = self.ckan_service.get_project_group(project_id)
-            # get ckan resources
-            ckan_resources = []
-            ckan_resources_search = ''
-            for package in group.get("packages", []):
-                ckan_resources = self.ckan_service.get_full_package(package["id"]).get("resources", [])
-                for resource in ckan_resources:
-                    if "format" in resource and "name" in resource:
-                        ckan_resources_search += ':' + resource["name"] + ':' + resource["format"]
-
-            # Get topics belonging to project ID
-            not_found_resources, topics = self.gcp_service.get_topics(
-                not_found_resource, gcp_services, not_found_resources, project_id
-            )
-
-            # Get subscriptions belonging to project ID
-            not_found_resources, subscriptions = self.gcp_service.get_subscriptions(
-                not_found_resource, gcp_services, not_found_resources, project_id
-            )
-            # Get buckets belonging to project ID
-            not_found_resources, buckets = self.gcp_service.get_buckets(
-                not_found_resource, gcp_services, not_found_resources, project_id
-            )
-
-            # Get SQL instances belonging to project ID
-            not_found_resources, sql_instances = self.gcp_service.get_sql_instances(
-                not_found_resource, gcp_services, not_found_resources, project_id
-            )
-            # Get SQL databases belonging to project ID
-            not_found_resources, sql_databases = self.gcp_service.get_sql_databases(
-                not_found_resource,
-                gcp_services,
-                sql_instances,
-                not_found_resources,
-                project_id,
-            )
-            # Get bigquery datasets belonging to project ID
-            not_found_resources, bigquery_datasets = self.gcp_service.get_bigquery_datasets(
-                not_found_resource, gcp_services, not_found_resources, project_id
-            )
-
-            resources = {
-                'topic': topics,
-                'subscription': subscriptions,
-                'blob-storage': buckets,
-                'cloudsql-instance': sql_instances,
-                'cloudsql-db': sql_databases,
-                'bigquery-dataset': bigquery_datasets
-            }
-            for key, value in resources.items():
-                for resource_name in value:
-                    search = ':' + resource_name + ':' + key
-                    if search not in ckan_resources_search and not self.is_default_resource(resource_name):
-                        logging.info(
-                            f"Resource {resource_name} could not be found on CKAN while it still exists in GCP"
-                        )
-                        not_found_resources.append(
-                            not_found_resource.make_not_found(
-                                "Resource not found",
-                                '',  # package name is a ckan-specific attribute
-                                resource_name,
-                                key,
-                                self.gcp_service.generate_resource_url(key, resource_name, project_id),
-                            )
-                        )
-        self.gcp_service.get_subscriber_client().close()
+        not_found_resources.extend(project_not_found_resources)
+        self.gcp_service.close()
+        self.scan_report.emit()
+        self.resource_filter.log_stats()
 
         # Create gobits object
         metadata = Gobits.from_request(request=request)
@@ -132,3 +75,111 @@ class GCPProcessor(object):
             config.TOPIC_PROJECT_ID, config.TOPIC_NAME,
             not_found_resources, [metadata.to_json()]
         )
+
+    def coordinate(self, request, shard_queue):
+        if not self.ckan_service.is_ckan_reachable():
+            return False
+
+        # The index is cached for the shards
+        self.load_catalog_index()
+        # The findings for projects missing on CKAN are published along with the first shard
+        not_found_resources, matching_projects = self.get_projects_to_check()
+        # Create gobits object, it is passed on to the shards for the aggregated result
+        metadata = Gobits.from_request(request=request)
+        ShardedRun(get_state_store()).start(
+            matching_projects,
+            getattr(config, "SHARD_SIZE", 25),
+            shard_queue,
+            [metadata.to_json()],
+            not_found_resources,
+        )
+        return True
+
+    def process_shard(self, shard_message):
+        self.load_catalog_index()
+        not_found_resources = self.process_projects(shard_message["project_ids"])
+        self.gcp_service.close()
+        self.scan_report.emit()
+        self.resource_filter.log_stats()
+
+        # The shard that completes the run publishes the findings of all shards
+        merged_not_found_resources = ShardedRun(get_state_store()).finish_shard(
+            shard_message, not_found_resources
+        )
+        if merged_not_found_resources is None:
+            return True
+
+        # Send issues to a topic
+        return self.gcp_helper.publish_to_topic(
+            config.TOPIC_PROJECT_ID, config.TOPIC_NAME,
+            merged_not_found_resources, shard_message["gobits"]
+        )
+
+    def process_projects(self, project_ids):
+        if getattr(config, "PARALLEL_SCAN", False):
+            results = self.scan_projects_concurrently(project_ids)
+        else:
+            results = {
+                project_id: self.check_project(project_id, self.process_project, project_id)
+                for project_id in project_ids
+            }
+        # Merged in order of project ID, so the findings do not depend on the order of scanning
+        not_found_resources = []
+        for project_id in sorted(results):
+            if results[project_id] is not None:
+                not_found_resources.extend(results[project_id])
+        return not_found_resources
+
+    def scan_projects_concurrently(self, project_ids):
+        # CKAN and GCP are queried by separate pools, so a slow side does not hold up the other
+        futures = {}
+        results = {}
+        with ThreadPoolExecutor(
+                max_workers=getattr(config, "CKAN_WORKERS", 4), thread_name_prefix="ckan"
+        ) as ckan_pool, ThreadPoolExecutor(
+            max_workers=getattr(config, "GCP_WORKERS", 8), thread_name_prefix="gcp"
+        ) as gcp_pool:
+            for project_id in project_ids:
+                futures[project_id] = (
+                    ckan_pool.submit(self.check_project, project_id, self.get_ckan_index, project_id),
+                    gcp_pool.submit(self.check_project, project_id, self.get_gcp_inventory, project_id),
+                )
+            for project_id, (ckan_future, gcp_future) in futures.items():
+                ckan_result = ckan_future.result()
+                gcp_result = gcp_future.result()
+                if ckan_result is None or gcp_result is None:
+                    results[project_id] = None
+                    continue
+                results[project_id] = self.check_project(
+                    project_id, self.compare_project, project_id, ckan_result, gcp_result
+                )
+        return results
+
+    def check_project(self, project_id, function, *args):
+        # A failing project is skipped, it does not abort the check of the other projects
+        try:
+            return function(*args)
+        except QuotaExhausted as e:
+            # Reporting the project as empty would result in false findings
+            logging.error(f"Project ID {project_id} is skipped: {e}")
+        except Exception:
+            logging.exception(f"Project ID {project_id} is skipped because its check failed")
+        return None
+
+    def process_project(self, project_id):
+        gcp_result = self.get_gcp_inventory(project_id)
+        ckan_result = self.get_ckan_index(project_id)
+        return self.compare_project(project_id, ckan_result, gcp_result)
+
+    def get_ckan_index(self, project_id):
+        return self.engine.get_ckan_side(project_id)
+
+    def get_gcp_inventory(self, project_id):
+        return self.engine.get_gcp_side(project_id)
+
+    def compare_project(self, project_id, ckan_result, gcp_result):
+        # Resources on GCP that are not documented on CKAN
+        not_found_resources = list(gcp_result["not_found_resources"])
+        not_found_resources.extend(self.engine.find_missing_on_ckan(project_id, gcp_result, ckan_result))
+        self.engine.record_project(project_id, gcp_result, ckan_result)
+        return not_found_resources
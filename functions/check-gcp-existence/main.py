@@ -1,24 +1,49 @@
+import base64
+import json
 import logging
 import os
 
 import config
+import state_store
 import urllib3
 from gcp_processor import GCPProcessor
+from sharding import PubSubShardQueue
+
+# The run state of this function is kept apart from the state of the other functions
+state_store.FUNCTION_NAME = "check-gcp-existence"
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 logging.basicConfig(level=logging.INFO)
 logging.getLogger("googleapiclient.http").setLevel(logging.ERROR)
 
 
-def check_gcp_existence(request):
-    logging.info("Initialized function")
-    if (
+def has_sufficient_configuration():
+    return (
             "PROJECT_ID" in os.environ
             and "CKAN_API_KEY_SECRET_ID" in os.environ
             and "CKAN_SITE_URL" in os.environ
             and hasattr(config, "DELEGATED_SA")
-    ):
-        process_bool = GCPProcessor().process(request)
+            and (getattr(config, "INVENTORY_BACKEND", "listing") != "asset_inventory" or hasattr(config, "ASSET_SCOPE"))
+            # Shards are published to their topic and only a shared state bucket lets the last shard see all others
+            and (
+                not getattr(config, "SHARD_MODE", False)
+                or (hasattr(config, "SHARD_TOPIC_NAME") and bool(getattr(config, "STATE_BUCKET", None)))
+            )
+    )
+
+
+def check_gcp_existence(request):
+    logging.info("Initialized function")
+    if has_sufficient_configuration():
+        if getattr(config, "SHARD_MODE", False):
+            # Only publish the shards, the shard workers do the actual check
+            shard_queue = PubSubShardQueue(
+                getattr(config, "SHARD_TOPIC_PROJECT_ID", config.TOPIC_PROJECT_ID),
+                config.SHARD_TOPIC_NAME,
+            )
+            process_bool = GCPProcessor().coordinate(request, shard_queue)
+        else:
+            process_bool = GCPProcessor().process(request)
         if process_bool is False:
             logging.info("GCP existence check has not run")
         else:
@@ -27,5 +52,22 @@ def check_gcp_existence(request):
         logging.error("Function has insufficient configuration")
 
 
+def check_gcp_existence_shard(request):
+    # Extract shard from the Pub/Sub push request
+    envelope = json.loads(request.data.decode("utf-8"))
+    shard_message = json.loads(base64.b64decode(envelope["message"]["data"]))
+    logging.info(
+        f"Shard {shard_message['shard_index']} of run {shard_message['run_id']} received"
+    )
+    if not has_sufficient_configuration():
+        logging.error("Function has insufficient configuration")
+        return "Server error", 500
+
+    GCPProcessor().process_shard(shard_message)
+
+    # Returning any 2xx status indicates successful receipt of the message.
+    return "OK", 204
+
+
 if __name__ == "__main__":
     check_gcp_existence(None)
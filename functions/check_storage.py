@@ -1,5 +1,9 @@
-from google.cloud import storage
+import collections
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
 import config
 
 import google.auth
@@ -8,25 +12,156 @@ from google.auth import iam
 from google.oauth2 import service_account
 
 TOKEN_URI = 'https://accounts.google.com/o/oauth2/token'  # nosec
+STORAGE_API_URL = 'https://storage.googleapis.com/storage/v1'
+
+
+class SchemaStorage(object):
+    # Reads schemas from the schemas bucket with one authenticated session for the life of the process
+    # The JSON API is used directly, so a schema is fetched with a single GET that also returns its generation
+
+    def __init__(self, bucket_name, cache_size=256, not_found_ttl=60, workers=8):
+        self.bucket_url = f"{STORAGE_API_URL}/b/{quote(bucket_name, safe='')}/o"
+        self.session = None
+        # Schemas by blob name as (generation, schema), least recently used first
+        self.cache = collections.OrderedDict()
+        self.cache_size = cache_size
+        # Blob names that did not exist, with the time until which they are not requested again
+        self.not_found = {}
+        self.not_found_ttl = not_found_ttl
+        # The generation of every blob in the bucket and the prefetched schemas of the current invocation
+        self.generations = None
+        self.prefetched = {}
+        self.workers = workers
+        self.stats = {
+            "requests": 0,
+            "downloaded": 0,
+            "not_modified": 0,
+            "not_found": 0,
+            "not_found_cached": 0,
+            "prefetched": 0,
+        }
+
+    def get_session(self):
+        # The delegated credentials are refreshed by the session when they expire
+        if self.session is None:
+            self.session = gcp_requests.AuthorizedSession(request_auth_token())
+        return self.session
+
+    def get_schema(self, tag):
+        blob_name = schema_name_from_tag(tag)
+        if blob_name in self.prefetched:
+            return self.prefetched[blob_name]
+        if self.not_found.get(blob_name, 0) > time.monotonic():
+            self.stats["not_found_cached"] += 1
+            return None
+        cached = self.cache.get(blob_name)
+        # Only download the schema again when its generation changed
+        status_code, generation, schema = self.download(blob_name, cached[0] if cached else None)
+        self.count_download(status_code)
+        if status_code == 304:
+            self.cache.move_to_end(blob_name)
+            return cached[1]
+        if status_code == 404:
+            self.cache.pop(blob_name, None)
+            self.not_found[blob_name] = time.monotonic() + self.not_found_ttl
+            return None
+        self.store(blob_name, generation, schema)
+        return schema
+
+    def download(self, blob_name, generation=None):
+        # Runs in the threads of a prefetch too, so the statistics are counted by the callers
+        params = {"alt": "media"}
+        if generation:
+            params["ifGenerationNotMatch"] = generation
+        response = self.get_session().get(f"{self.bucket_url}/{quote(blob_name, safe='')}", params=params)
+        if response.status_code in (304, 404):
+            return response.status_code, None, None
+        response.raise_for_status()
+        return response.status_code, response.headers["x-goog-generation"], json.loads(response.content)
+
+    def count_download(self, status_code):
+        self.stats["requests"] += 1
+        if status_code == 200:
+            self.stats["downloaded"] += 1
+        elif status_code == 304:
+            self.stats["not_modified"] += 1
+        elif status_code == 404:
+            self.stats["not_found"] += 1
+
+    def store(self, blob_name, generation, schema):
+        self.not_found.pop(blob_name, None)
+        self.cache[blob_name] = (generation, schema)
+        self.cache.move_to_end(blob_name)
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def list_generations(self):
+        # Lists the bucket page by page, only the names and generations of the blobs are requested
+        generations = {}
+        params = {"fields": "items(name,generation),nextPageToken", "maxResults": 1000}
+        while True:
+            self.stats["requests"] += 1
+            response = self.get_session().get(self.bucket_url, params=params)
+            response.raise_for_status()
+            page = response.json()
+            for item in page.get("items", []):
+                generations[item["name"]] = item["generation"]
+            if "nextPageToken" not in page:
+                return generations
+            params["pageToken"] = page["nextPageToken"]
+
+    def start_invocation(self):
+        # The bucket is listed again by the first prefetch of an invocation
+        self.generations = None
+        self.prefetched = {}
+
+    def prefetch(self, tags):
+        # Downloads the schemas of the tags concurrently, they are served from memory for the rest of the invocation
+        if self.generations is None:
+            self.generations = self.list_generations()
+        to_download = []
+        for blob_name in {schema_name_from_tag(tag) for tag in tags}:
+            if blob_name in self.prefetched:
+                continue
+            generation = self.generations.get(blob_name)
+            cached = self.cache.get(blob_name)
+            if generation is None:
+                self.prefetched[blob_name] = None
+            elif cached and cached[0] == generation:
+                self.prefetched[blob_name] = cached[1]
+            else:
+                to_download.append(blob_name)
+        if to_download:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                downloads = executor.map(self.download, to_download)
+                for blob_name, (status_code, generation, schema) in zip(to_download, downloads):
+                    self.count_download(status_code)
+                    self.prefetched[blob_name] = schema
+                    if schema is not None:
+                        self.store(blob_name, generation, schema)
+        self.stats["prefetched"] += len(to_download)
+        return {tag: self.prefetched[schema_name_from_tag(tag)] for tag in tags}
+
+
+schema_storage = None
+
+
+def get_schema_storage():
+    # Created once per process, so warm invocations reuse the session and caches
+    global schema_storage
+    if schema_storage is None:
+        schema_storage = SchemaStorage(
+            config.SCHEMAS_BUCKET,
+            getattr(config, "SCHEMA_CACHE_SIZE", 256),
+            getattr(config, "SCHEMA_NOT_FOUND_TTL_SECONDS", 60),
+            getattr(config, "PREFETCH_WORKERS", 8),
+        )
+    return schema_storage
 
 
 def check_schema_stg(tag):
-    # Get schemas bucket from other project
-    external_credentials = request_auth_token()
-    storage_client_external = storage.Client(credentials=external_credentials)
-    storage_bucket = storage_client_external.get_bucket(config.SCHEMAS_BUCKET)
-    blob_name = schema_name_from_tag(tag)
-    # Check if schema is in schema storage
-    if storage.Blob(bucket=storage_bucket, name=blob_name).exists(storage_client_external):
-        # Get blob
-        blob = storage_bucket.get_blob(blob_name)
-        # Convert to string
-        blob_json_string = blob.download_as_string()
-        # Convert to json
-        blob_json = json.loads(blob_json_string)
-        # return blob in json format
-        return blob_json
-    return None
+    # Get schema from the schemas bucket in the other project, None if it does not exist
+    return get_schema_storage().get_schema(tag)
 
 
 def schema_name_from_tag(tag):
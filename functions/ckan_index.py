@@ -0,0 +1,23 @@
+class CKANResourceIndex(object):
+    # CKAN resources of a project by name and format, with the packages that document them
+
+    def __init__(self):
+        self.packages = {}
+
+    def add_package(self, package):
+        package_name = package.get("name", "")
+        for resource in package.get("resources", []):
+            if "format" in resource and "name" in resource:
+                packages = self.packages.setdefault((resource["name"], resource["format"]), [])
+                if package_name not in packages:
+                    packages.append(package_name)
+
+    def contains(self, resource_name, resource_format):
+        return (resource_name, resource_format) in self.packages
+
+    def get_packages(self, resource_name, resource_format):
+        # Names of the packages documenting the resource, empty if it is not documented
+        return list(self.packages.get((resource_name, resource_format), []))
+
+    def __len__(self):
+        return len(self.packages)
@@ -49,3 +49,9 @@ class CKANService:
 
     def get_full_package(self, package_id):
         return self.host.action.package_show(id=package_id)
+
+    def search_packages(self, start, rows):
+        # A page of all packages with their groups and resources, sorted so the pages do not overlap
+        return self.host.action.package_search(
+            q="*:*", start=start, rows=rows, sort="name asc", include_private=True
+        )
@@ -1,6 +1,7 @@
 import logging
 import os
 
+import config
 import urllib3
 from ckan_service import CKANService
 from gcp_service import GCPService
@@ -22,6 +23,17 @@ class CKANProcessor(object):
         group = self.ckan_service.get_project_group(selector_data)
         tag_dict = self.ckan_service.create_tag_dict(selector_data)
 
+        if getattr(config, "PREFETCH_SCHEMAS", False):
+            # Download the schemas of all resources at once instead of one by one
+            self.gcp_service.prefetch_schemas(
+                {
+                    resource["describedBy"]
+                    for data in selector_data.get("dataset", [])
+                    for resource in data["distribution"]
+                    if "describedBy" in resource
+                }
+            )
+
         if len(selector_data.get("dataset", [])) > 0:
             for data in selector_data["dataset"]:
                 # Put the details of the dataset we're going to create into a dict
@@ -1,25 +1,69 @@
 import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
 
 import config
 from gcp_helper import GCPHelper
 from google.cloud import storage
+from google.cloud.exceptions import NotFound
 
 
 class GCPService:
 
     def __init__(self):
         self.gcp_helper = GCPHelper()
+        # Schemas by tag prefetched for the current message, None when not in the schemas storage
+        self.prefetched_schemas = {}
+
+    def prefetch_schemas(self, tags):
+        # List the schemas bucket once and download the schemas of the tags in parallel
+        self.prefetched_schemas = {}
+        if not tags:
+            return
+        external_credentials = self.gcp_helper.request_auth_token()
+        storage_client_external = storage.Client(credentials=external_credentials)
+        storage_bucket = storage_client_external.bucket(config.SCHEMAS_BUCKET)
+        blob_names = {
+            blob.name
+            for blob in storage_client_external.list_blobs(
+                storage_bucket, fields="items(name),nextPageToken"
+            )
+        }
+
+        def download(blob_name):
+            try:
+                return json.loads(storage_bucket.blob(blob_name).download_as_bytes())
+            except NotFound:  # Deleted after the bucket was listed
+                return None
+
+        tags_to_download = [tag for tag in tags if self.schema_name_from_tag(tag) in blob_names]
+        with ThreadPoolExecutor(max_workers=getattr(config, "PREFETCH_WORKERS", 8)) as executor:
+            schemas = executor.map(
+                download, [self.schema_name_from_tag(tag) for tag in tags_to_download]
+            )
+            self.prefetched_schemas = dict(zip(tags_to_download, schemas))
+        for tag in tags:
+            self.prefetched_schemas.setdefault(tag, None)
+        logging.info(
+            f"Prefetched {len(tags_to_download)} of {len(tags)} schemas from {len(blob_names)} stored schemas"
+        )
+
+    @staticmethod
+    def schema_name_from_tag(tag):
+        tag = tag.replace("/", "_")
+        if not tag.endswith(".json"):
+            tag = tag + ".json"
+        return tag
 
     def check_schema_stg(self, tag):
+        if tag in self.prefetched_schemas:
+            return self.prefetched_schemas[tag]
         # Get schemas bucket from other project
         external_credentials = self.gcp_helper.request_auth_token()
         storage_client_external = storage.Client(credentials=external_credentials)
         storage_bucket = storage_client_external.get_bucket(config.SCHEMAS_BUCKET)
         # Get schema name from tag
-        tag = tag.replace('/', '_')
-        if not tag.endswith(".json"):
-            tag = tag + ".json"
-        blob_name = tag
+        blob_name = self.schema_name_from_tag(tag)
         # Check if schema is in schema storage
         if storage.Blob(bucket=storage_bucket, name=blob_name).exists(storage_client_external):
             # Get blob
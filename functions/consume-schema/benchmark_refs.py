@@ -0,0 +1,101 @@
+import argparse
+import json
+import random
+import sys
+import timeit
+import tracemalloc
+
+from schema_refs import get_external_refs
+
+
+def get_refs_from_lines(schema):
+    # The line based parser CKANProcessor used before schema_refs, kept to compare against
+    references = []
+    schema = json.dumps(schema, indent=2)
+    for line in schema.split('\n'):
+        if '$ref' in line:
+            if '#' in line:
+                if '"$ref": "' in line:
+                    line_array_def = line.split('"$ref": "')
+                elif '"$ref" : "' in line:
+                    line_array_def = line.split('"$ref" : "')
+                else:
+                    line_array_def = ''
+                if line_array_def:
+                    ref_def = line_array_def[1].replace('\"', '')
+                    if ref_def != '#':
+                        if 'tag' in ref_def or 'http' in ref_def:
+                            references.append(ref_def.split("#/")[0])
+            else:
+                if '"$ref": "' in line:
+                    line_array = line.split('"$ref": "')
+                elif '"$ref" : "' in line:
+                    line_array = line.split('"$ref" : "')
+                else:
+                    line_array = ''
+                if line_array:
+                    references.append(line_array[1].replace('\"', ''))
+    return references
+
+
+def make_schema(depth, breadth, external_refs, rng):
+    # A nested object schema with a mix of local and external references at every level
+    def make_node(level):
+        if level == depth:
+            if rng.random() < 0.5:
+                return {"$ref": "#/definitions/leaf"}
+            tag = rng.randrange(external_refs)
+            return {"$ref": f"https://schemas.example.com/tag{tag}.json#/definitions/item"}
+        return {
+            "type": "object",
+            "description": f"Level {level}",
+            "properties": {f"field{i}": make_node(level + 1) for i in range(breadth)},
+            "items": [{"$ref": f"https://schemas.example.com/tag{rng.randrange(external_refs)}.json"}],
+        }
+
+    schema = make_node(0)
+    schema["$schema"] = "http://json-schema.org/draft-07/schema#"
+    schema["$id"] = "https://schemas.example.com/root.json"
+    schema["definitions"] = {"leaf": {"type": "string"}}
+    return schema
+
+
+def measure(function, schema, repeat):
+    seconds = min(timeit.repeat(lambda: function(schema), number=1, repeat=repeat))
+    tracemalloc.start()
+    function(schema)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the $ref extraction of consume-schema")
+    parser.add_argument("--depths", default="3,5,7", help="Comma separated nesting depths to benchmark")
+    parser.add_argument("--breadth", type=int, default=4, help="Number of properties per object")
+    parser.add_argument("--external-refs", type=int, default=50, help="Number of distinct external schemas")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement, the fastest is reported")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    print(f"{'depth':>5} {'nodes':>8} {'size_kb':>8} {'lines_ms':>9} {'walk_ms':>8} {'speedup':>7} "
+          f"{'lines_kb':>8} {'walk_kb':>8} {'refs':>5}")
+    for depth in [int(depth) for depth in args.depths.split(",")]:
+        schema = make_schema(depth, args.breadth, args.external_refs, random.Random(args.seed))
+        size = len(json.dumps(schema))
+        nodes = sum(args.breadth ** level for level in range(depth + 1))
+        lines_seconds, lines_peak = measure(get_refs_from_lines, schema, args.repeat)
+        walk_seconds, walk_peak = measure(get_external_refs, schema, args.repeat)
+        refs = get_external_refs(schema)
+        # The walk returns every external schema once, the line parser once per occurrence
+        if set(refs) != set(get_refs_from_lines(schema)):
+            print(f"Depth {depth}: references differ from the line based parser", file=sys.stderr)
+            return 1
+        print(f"{depth:>5} {nodes:>8} {size / 1024:>8.1f} {lines_seconds * 1000:>9.2f} "
+              f"{walk_seconds * 1000:>8.2f} {lines_seconds / walk_seconds:>6.1f}x "
+              f"{lines_peak / 1024:>8.1f} {walk_peak / 1024:>8.1f} {len(refs):>5}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,13 +5,22 @@ import requests
 import urllib3
 import check_storage
 import json
+import threading
+import time
+
+from patch_executor import PatchExecutor
+from schema_format import canonicalize, hash_schemas, make_reference
+from schema_refs import get_external_refs
+from schema_resolver import SchemaResolver
 
 from google.cloud import secretmanager
 
-from ckanapi import RemoteCKAN, NotFound, SearchError
+from ckanapi import RemoteCKAN, NotFound, SearchError, ValidationError
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+BACKFILL_CHECKPOINT = "backfill_checkpoint.json"
+
 
 class CKANProcessor(object):
 
@@ -26,134 +35,244 @@ class CKANProcessor(object):
         self.ckan_host = os.environ.get('CKAN_SITE_URL', 'Required parameter is missing')
         self.session = requests.Session()
         self.session.verify = True
+        # The patch workers share the session, so it keeps a connection per worker
+        patch_workers = getattr(config, "PATCH_WORKERS", 4)
+        self.session.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=max(10, patch_workers)))
         self.host = RemoteCKAN(self.ckan_host, apikey=self.api_key, session=self.session)
+        # Kept over warm invocations, so schemas resolved before are not resolved again
+        self.resolver = SchemaResolver()
+        self.serialized_schemas = {}
+        # 'pretty' stores every schema indented, 'compact' stores minified schemas and references instead of copies
+        self.storage_format = getattr(config, "SCHEMA_STORAGE_FORMAT", "pretty")
+        self.patch_stats = {'applied': 0, 'skipped': 0, 'failed': 0}
+        self.patch_lock = threading.Lock()
+        self.pending_patches = []
+        self.patch_executor = PatchExecutor(patch_workers, getattr(config, "CKAN_WRITES_PER_MINUTE", 600))
 
     def process(self, payload):
         schemas = payload[os.environ.get('DATA_SELECTOR', 'Required parameter is missing')]
 
-        # Get all resources on CKAN that are a topic
-        resources = self.host.action.resource_search(query="format:topic")
-        resources = resources['results']
+        # Get the resources on CKAN that are a topic and have the tag of one of the schemas
+        tags = {schema['$id'] for schema in schemas if '$id' in schema}
+        resources = self.get_topic_resources(tags)
+        # Index the resources by their schema tag once, instead of looping over them for every schema
+        resources_by_tag = self.index_resources(resources)
 
+        # Index the schemas of the message by their ID
+        self.resolver.index(schemas)
+        self.resolver.reset_stats()
+        self.serialized_schemas = {}
+        self.patch_stats = {'applied': 0, 'skipped': 0, 'failed': 0}
+        check_storage.get_schema_storage().start_invocation()
+        if getattr(config, "PREFETCH_SCHEMAS", False):
+            self.prefetch_references(
+                [schema for schema in schemas if schema.get('$id') in resources_by_tag], schemas
+            )
+        self.pending_patches = []
         for schema in schemas:
-            references = self.get_refs(schema, schemas)
-            self.schema_to_ckan(schema, references, resources)
+            self.schema_to_ckan(schema, resources_by_tag)
+        self.patch_executor.run(self.write_resource, self.pending_patches)
+        logging.info(f"Schema references resolved: {json.dumps(self.resolver.stats)}")
+        logging.info(f"Resource patches: {json.dumps(self.patch_stats)}")
+        logging.info(f"Schema storage since start: {json.dumps(check_storage.get_schema_storage().stats)}")
+
+        if getattr(config, "VERIFY_RESOURCES", False):
+            self.verify_resources(tags)
+
+    def search_resources(self, query, offset=0, order_by=None):
+        # Streams the results page by page, a single search only returns the default page of CKAN
+        page_size = getattr(config, "RESOURCE_SEARCH_PAGE_SIZE", 1000)
+        search_args = {'order_by': order_by} if order_by else {}
+        while True:
+            result = self.host.action.resource_search(query=query, offset=offset, limit=page_size, **search_args)
+            for resource in result['results']:
+                yield resource
+            offset += len(result['results'])
+            if not result['results'] or offset >= result['count']:
+                break
 
+    def get_topic_resources(self, tags):
+        if len(tags) <= getattr(config, "TARGETED_SEARCH_MAX_TAGS", 25):
+            try:
+                resources = []
+                for tag in sorted(tags):
+                    # CKAN matches a part of the value, so the tag of the results is compared again
+                    resources.extend(
+                        resource
+                        for resource in self.search_resources(["format:topic", f"schema_tag:{tag}"])
+                        if resource.get('schema_tag') == tag
+                    )
+                return resources
+            except (SearchError, ValidationError):
+                logging.info("Searching resources by schema tag failed, searching all topic resources instead")
+        return [
+            resource
+            for resource in self.search_resources("format:topic")
+            if resource.get('schema_tag') in tags
+        ]
+
+    def verify_resources(self, tags):
         # Check if every resource now has schemas
-        resources = self.host.action.resource_search(query="format:topic")
-        resources = resources['results']
-
-    def get_refs(self, schema, schemas):
-        # Find references in schema
-        schema_references = self.get_refs_from_schema(schema)
-        references = []
-        references_not_found = []
-        for ref in schema_references:
-            references_not_found.append(ref)
-        for ref in schema_references:
-            # Check if schema references were send in message
-            for s in schemas:
-                if "$id" in s:
-                    if s["$id"] == ref:
-                        references_not_found.remove(ref)
-                        references.append(json.dumps(s, indent=2))
-        # Check if there are schema references not found in message
-        references_not_found_two = []
-        if len(references_not_found) != 0:
-            for r in references_not_found:
-                references_not_found_two.append(r)
-            for r in references_not_found:
-                # Check if the schema can be found in the schemas storage
-                schema_from_storage = check_storage.check_schema_stg(r)
-                if schema_from_storage:
-                    # If it can be found, add it to references
-                    references.append(json.dumps(schema_from_storage, indent=2))
-                    references_not_found_two.remove(r)
+        started = time.monotonic()
+        resources = self.get_topic_resources(tags)
+        without_schemas = [resource['name'] for resource in resources if not resource.get('schemas')]
+        logging.info(
+            f"Verified {len(resources)} resources in {time.monotonic() - started:.3f} seconds, "
+            f"{len(without_schemas)} without schemas {without_schemas}"
+        )
+
+    @staticmethod
+    def index_resources(resources):
+        resources_by_tag = {}
+        for resource in resources:
+            # If the resource has a key 'schema_tag'
+            if 'schema_tag' in resource:
+                resources_by_tag.setdefault(resource['schema_tag'], []).append(resource)
+        return resources_by_tag
+
+    def serialize_schema(self, schema):
+        # A schema is serialized once per message, the same string is patched on every resource
+        if '$id' not in schema:
+            return self.dump_schema(schema)
+        if schema['$id'] not in self.serialized_schemas:
+            self.serialized_schemas[schema['$id']] = self.dump_schema(schema)
+        return self.serialized_schemas[schema['$id']]
+
+    def dump_schema(self, schema):
+        if self.storage_format == 'compact':
+            return canonicalize(schema)
+        return json.dumps(schema, indent=2)
+
+    def serialize_reference(self, schema_id):
+        # The compact format stores the $id and hash of a referenced schema instead of a copy
+        schema = self.resolver.get_schema(schema_id)
+        if self.storage_format != 'compact':
+            return self.serialize_schema(schema)
+        key = ('reference', schema_id)
+        if key not in self.serialized_schemas:
+            self.serialized_schemas[key] = make_reference(schema_id, schema)
+        return self.serialized_schemas[key]
+
+    @staticmethod
+    def prefetch_references(schemas_to_resolve, schemas):
+        # Download the referenced schemas that are not in the message in parallel, a level of references per round
+        schema_storage = check_storage.get_schema_storage()
+        schemas_by_id = {schema['$id']: schema for schema in schemas if '$id' in schema}
+        seen = {schema['$id'] for schema in schemas_to_resolve}
+        pending = schemas_to_resolve
+        while pending:
+            tags = set()
+            next_pending = []
+            for schema in pending:
+                for ref in get_external_refs(schema):
+                    if ref in seen:
+                        continue
+                    seen.add(ref)
+                    # The references of a schema in the message are prefetched in the next round
+                    if ref in schemas_by_id:
+                        next_pending.append(schemas_by_id[ref])
+                    else:
+                        tags.add(ref)
+            next_pending.extend(schema for schema in schema_storage.prefetch(tags).values() if schema)
+            pending = next_pending
+
+    def get_refs(self, schema):
+        # Find the schemas referenced by the schema, also through the schemas it refers to
+        reference_ids, references_not_found = self.resolver.get_closure(schema)
         # Check if all references are found
-        if len(references_not_found_two) != 0:
+        if references_not_found:
             if "$id" in schema:
-                logging.info(f"Schema {schema['$id']} contains references {references_not_found_two}"
+                logging.info(f"Schema {schema['$id']} contains references {references_not_found}"
                              " that could not be found")
-        return references
-
-    def get_refs_from_schema(self, schema):
-        references = []
-        schema = json.dumps(schema, indent=2)
-        # Make schema into list so that every newline can be printed
-        schema_list = schema.split('\n')
-        for line in schema_list:
-            if '$ref' in line:
-                # If a '#' is in the reference, it's a reference to a definition
-                if '#' in line:
-                    if '"$ref": "' in line:
-                        line_array_def = line.split('"$ref": "')
-                    elif '"$ref" : "' in line:
-                        line_array_def = line.split('"$ref" : "')
-                    else:
-                        line_array_def = ''
-                    if line_array_def:
-                        ref_def = line_array_def[1].replace('\"', '')
-                        # If the reference is not '#'
-                        if ref_def != '#':
-                            # Check if there is a URI in front of the '#'
-                            # Because then the definition is in another schema
-                            if 'tag' in ref_def or 'http' in ref_def:
-                                # Split on the '#/'
-                                ref_def_array = ref_def.split("#/")
-                                uri_part = ref_def_array[0]
-                                references.append(uri_part)
-                # If reference is an URL
-                else:
-                    if '"$ref": "' in line:
-                        line_array = line.split('"$ref": "')
-                    elif '"$ref" : "' in line:
-                        line_array = line.split('"$ref" : "')
-                    else:
-                        line_array = ''
-                    if line_array:
-                        ref = line_array[1].replace('\"', '')
-                        references.append(ref)
-        return references
+        return [self.serialize_reference(schema_id) for schema_id in reference_ids]
 
-    def schema_to_ckan(self, schema, references, resources):
+    def schema_to_ckan(self, schema, resources_by_tag):
         # If the schema has an id
         if '$id' in schema:
-            tag_schema = schema['$id']
-            for resource in resources:
-                # If the resource has a key 'schema_tag'
-                if 'schema_tag' in resource:
-                    schema_tag_resource = resource['schema_tag']
-                    # If the tag of the processed schema coming from the topic
-                    # is the same as one of the resources
-                    schemas_to_patch = []
-                    if schema_tag_resource == tag_schema:
-                        # Give that resource a schema with its references
-                        schemas_to_patch = [json.dumps(schema, indent=2)]
-                        schemas_to_patch.extend(references)
-                        self.patch_resource(resource, schemas_to_patch)
+            # The resources whose schema tag is the same as the tag of the processed schema
+            resources = resources_by_tag.get(schema['$id'], [])
+            if resources:
+                # Give those resources a schema with its references
+                schemas_to_patch = [self.serialize_schema(schema)]
+                schemas_to_patch.extend(self.get_refs(schema))
+                schemas_hash = hash_schemas(schemas_to_patch)
+                for resource in resources:
+                    # The patches of all schemas in the message are run together afterwards
+                    if self.needs_patch(resource, schemas_hash):
+                        self.pending_patches.append((resource, schemas_to_patch))
         else:
             logging.info("The schema from the topic does not have an ID")
 
-    def check_resources(self, schemas, resources):
+    def patch_missing_schemas(self, resources):
+        # Give the resources without schemas the schema of their tag, from the resolver or the schemas storage
+        resources = [
+            resource for resource in resources if 'schema_tag' in resource and not resource.get('schemas')
+        ]
+        if getattr(config, "PREFETCH_SCHEMAS", False):
+            check_storage.get_schema_storage().prefetch({resource['schema_tag'] for resource in resources})
+        self.pending_patches = []
         for resource in resources:
-            # If the resource has a key 'schema_tag'
-            if 'schema_tag' in resource:
-                schema_tag_resource = resource['schema_tag']
-                schemas_to_patch = []
-                if 'schemas' not in resource:
-                    # Check if the schema can be found in the schemas storage
-                    schema_from_storage = check_storage.check_schema_stg(schema_tag_resource)
-                    if schema_from_storage:
-                        # Get the references
-                        references_gcp = self.get_refs(schema_from_storage, schemas)
-                        # If the schema can be found, give the resource a schema with its references
-                        schemas_to_patch = [schema_from_storage]
-                        schemas_to_patch.extend(references_gcp)
-                        self.patch_resource(resource, schemas_to_patch)
-
-    def patch_resource(self, resource, schemas):
+            # Schemas are loaded once through the resolver, also when several resources have the same tag
+            schema = self.resolver.get_schema(resource['schema_tag'])
+            if schema:
+                # Give the resource a schema with its references
+                schemas_to_patch = [self.serialize_schema(schema)]
+                schemas_to_patch.extend(self.get_refs(schema))
+                self.pending_patches.append((resource, schemas_to_patch))
+        self.patch_executor.run(self.write_resource, self.pending_patches)
+
+    def backfill(self, state_store):
+        # Patches the topic resources that have a schema tag but no schemas, in batches within a time budget
+        # The offset in the resources ordered by ID is checkpointed, so a large catalog is covered over several runs
+        started = time.monotonic()
+        budget_seconds = getattr(config, "BACKFILL_BUDGET_SECONDS", 480)
+        batch_size = getattr(config, "BACKFILL_BATCH_SIZE", 100)
+        checkpoint = state_store.load(BACKFILL_CHECKPOINT) or {"offset": 0}
+        offset = checkpoint["offset"]
+        self.resolver.index([])
+        self.resolver.reset_stats()
+        self.serialized_schemas = {}
+        self.patch_stats = {'applied': 0, 'skipped': 0, 'failed': 0}
+        check_storage.get_schema_storage().start_invocation()
+        logging.info(f"Backfilling schemas from resource {offset}")
+
+        batch = []
+        completed = True
+        for resource in self.search_resources("format:topic", offset=offset, order_by="id"):
+            offset += 1
+            if 'schema_tag' in resource and not resource.get('schemas'):
+                batch.append(resource)
+            if len(batch) >= batch_size:
+                self.patch_missing_schemas(batch)
+                batch = []
+                state_store.save(BACKFILL_CHECKPOINT, {"offset": offset})
+            if time.monotonic() - started > budget_seconds:
+                completed = False
+                break
+        self.patch_missing_schemas(batch)
+
+        if completed:
+            # Every resource is checked, the next run starts from the first resource again
+            state_store.delete(BACKFILL_CHECKPOINT)
+        else:
+            state_store.save(BACKFILL_CHECKPOINT, {"offset": offset})
+        logging.info(
+            f"Backfill {'completed' if completed else 'stopped at resource ' + str(offset)} in "
+            f"{time.monotonic() - started:.3f} seconds, resource patches: {json.dumps(self.patch_stats)}"
+        )
+        logging.info(f"Schema references resolved: {json.dumps(self.resolver.stats)}")
+        return completed
+
+    def needs_patch(self, resource, schemas_hash):
+        # Skip the patch when the resource already has the same schemas, so it is not rewritten and reindexed
+        if schemas_hash is not None and hash_schemas(resource.get('schemas')) == schemas_hash:
+            self.count_patch('skipped')
+            logging.debug(f"Resource '{resource['name']}' already has the schema")
+            return False
+        return True
+
+    def write_resource(self, resource, schemas):
         # Now patch the resource and give it the new schema
-        # Could be that the schema is already there
         # It will be overwritten because the new schema should be the right schema
         try:
             resource_dict = {
@@ -164,8 +283,16 @@ class CKANProcessor(object):
                 'schemas': schemas
             }
             self.host.action.resource_patch(**resource_dict)
+            self.count_patch('applied')
             logging.info(f"Added schema to resource '{resource['name']}'")
         except NotFound:  # Resource does not exist
+            self.count_patch('failed')
             logging.info(f"Resource '{resource['name']}' does not exist")
         except SearchError:
+            self.count_patch('failed')
             logging.error(f"SearchError occured while updating resource '{resource['name']}'")
+
+    def count_patch(self, outcome):
+        # Patches run on the threads of the patch executor
+        with self.patch_lock:
+            self.patch_stats[outcome] += 1
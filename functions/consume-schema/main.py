@@ -4,6 +4,10 @@ import base64
 import os
 from ckanprocessor import CKANProcessor
 import requests
+import state_store
+
+# The backfill checkpoint of this function is kept apart from the state of the other functions
+state_store.FUNCTION_NAME = "consume-schema"
 
 parser = CKANProcessor()
 
@@ -39,5 +43,16 @@ def schema_to_ckan(request):
     return 'OK', 204
 
 
+def backfill_schemas(request):
+    # Scheduled entry point giving the topic resources without schemas the schema of their tag
+    ckan_host = os.environ.get('CKAN_SITE_URL', 'Required parameter is missing')
+    status = requests.head(ckan_host).status_code
+    if status != 200:
+        logging.info("CKAN is down")
+        return 'CKAN down', 503
+    completed = parser.backfill(state_store.get_state_store())
+    return ('Completed' if completed else 'Checkpointed'), 200
+
+
 if __name__ == '__main__':
     logging.info("Hallo")
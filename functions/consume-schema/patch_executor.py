@@ -0,0 +1,42 @@
+import logging
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from token_bucket import TokenBucket
+
+
+class PatchExecutor(object):
+    # Runs resource patches on a bounded number of threads, limited to a number of CKAN writes per minute
+    # More threads than writes allowed per second would only wait on the limit, so the width is capped by it
+
+    def __init__(self, workers, writes_per_minute):
+        self.workers = max(1, min(workers, math.ceil(writes_per_minute / 60.0)))
+        self.bucket = TokenBucket(writes_per_minute)
+        self.waited_seconds = 0.0
+        self.lock = threading.Lock()
+
+    def run(self, patch, tasks):
+        # Calls patch with the arguments of every task, errors per resource are handled by patch itself
+        def limited_patch(task):
+            waited = self.bucket.acquire()
+            with self.lock:
+                self.waited_seconds += waited
+            patch(*task)
+
+        started = time.monotonic()
+        self.waited_seconds = 0.0
+        if self.workers == 1 or len(tasks) <= 1:
+            for task in tasks:
+                limited_patch(task)
+        else:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                list(executor.map(limited_patch, tasks))
+        seconds = time.monotonic() - started
+        if tasks:
+            logging.info(
+                f"Patched {len(tasks)} resources with {self.workers} workers in {seconds:.3f} seconds "
+                f"({len(tasks) / max(seconds, 0.001):.1f} per second), "
+                f"{self.waited_seconds:.1f} seconds waited on the write limit"
+            )
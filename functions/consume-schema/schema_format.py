@@ -0,0 +1,63 @@
+import hashlib
+import json
+import logging
+
+
+def canonicalize(schema):
+    # The same schema always gives the same text, regardless of key order and indentation
+    if isinstance(schema, str):
+        schema = json.loads(schema)
+    return json.dumps(schema, sort_keys=True, separators=(",", ":"))
+
+
+def hash_schemas(schemas):
+    # Hash of the exact text of a resource's schemas, None when they are missing or cannot be parsed
+    # CKAN may return the field as the list that was patched or as its JSON encoding
+    # The text is not canonicalized, so schemas stored in another format or indentation do not match
+    if not schemas:
+        return None
+    try:
+        if isinstance(schemas, str):
+            schemas = json.loads(schemas)
+        if not isinstance(schemas, list):
+            return None
+        text = json.dumps([schema if isinstance(schema, str) else json.dumps(schema) for schema in schemas])
+    except ValueError:
+        return None
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def hash_schema(schema):
+    return hashlib.sha256(canonicalize(schema).encode("utf-8")).hexdigest()
+
+
+def make_reference(schema_id, schema):
+    # Stored by the compact format instead of a copy of a referenced schema
+    # It is a valid schema itself, referring to the schema it stands for
+    return json.dumps({"$ref": schema_id, "sha256": hash_schema(schema)}, sort_keys=True, separators=(",", ":"))
+
+
+def is_reference(schema):
+    return isinstance(schema, dict) and set(schema) == {"$ref", "sha256"}
+
+
+def expand_schemas(schemas, load_schema):
+    # Returns the parsed schemas of a resource, with the references of the compact format replaced by the schemas
+    # they refer to, loaded with load_schema (e.g. check_storage.check_schema_stg)
+    if isinstance(schemas, str):
+        schemas = json.loads(schemas)
+    expanded = []
+    for schema in schemas or []:
+        if isinstance(schema, str):
+            schema = json.loads(schema)
+        if is_reference(schema):
+            referenced_schema = load_schema(schema["$ref"])
+            if referenced_schema is None:
+                logging.warning(f"Referenced schema {schema['$ref']} could not be found")
+                expanded.append(schema)
+                continue
+            if hash_schema(referenced_schema) != schema["sha256"]:
+                logging.warning(f"Referenced schema {schema['$ref']} changed since the resource was patched")
+            schema = referenced_schema
+        expanded.append(schema)
+    return expanded
@@ -0,0 +1,25 @@
+def iter_refs(schema):
+    # Walks the parsed schema without recursion and yields every '$ref' value in document order
+    stack = [schema]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            ref = node.get("$ref")
+            if isinstance(ref, str):
+                yield ref
+            stack.extend(reversed(list(node.values())))
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
+
+
+def get_external_refs(schema):
+    # The URIs of the schemas referenced by this schema, the part of a reference before the '#'
+    # References to definitions within the schema itself ('#/...') are skipped
+    references = []
+    seen = set()
+    for ref in iter_refs(schema):
+        uri = ref.split("#", 1)[0]
+        if uri and uri not in seen:
+            seen.add(uri)
+            references.append(uri)
+    return references
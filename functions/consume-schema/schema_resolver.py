@@ -0,0 +1,118 @@
+import json
+import logging
+
+import check_storage
+from schema_refs import get_external_refs
+
+
+class SchemaResolver(object):
+    # Resolves the schemas a schema refers to, directly or through the schemas it refers to
+    # The resolver outlives a message, so warm invocations reuse the schemas and closures resolved before
+
+    def __init__(self, load_schema=check_storage.check_schema_stg):
+        self.load_schema = load_schema
+        # Schemas by $id from the messages
+        self.schemas = {}
+        # Schemas by $id from the schemas bucket, cleared for every message so the schema storage revalidates them
+        self.loaded = {}
+        self.serialized = {}
+        # References that are not in the schemas bucket, cleared for every message
+        self.not_found = set()
+        # Per $id the IDs of all schemas it refers to and the references that could not be found
+        self.closures = {}
+        # Counted per message or backfill run
+        self.reset_stats()
+
+    def index(self, schemas):
+        # Index the schemas of a message by $id, closures depending on a new or changed schema are resolved again
+        # Closures with references that could not be found are resolved again too, the schema may be stored by now
+        # So are closures with schemas from the schemas bucket, they may have been updated since
+        changed = set()
+        for schema in schemas:
+            if "$id" not in schema:
+                continue
+            schema_id = schema["$id"]
+            serialized = json.dumps(schema, sort_keys=True)
+            if self.serialized.get(schema_id) != serialized:
+                changed.add(schema_id)
+                self.serialized[schema_id] = serialized
+            self.schemas[schema_id] = schema
+        changed.update(self.loaded)
+        self.closures = {
+            schema_id: closure
+            for schema_id, closure in self.closures.items()
+            if not closure[1] and not changed & ({schema_id} | set(closure[0]))
+        }
+        self.loaded = {}
+        self.not_found = set()
+
+    def reset_stats(self):
+        self.stats = {"resolved": 0, "memoized": 0, "loaded": 0, "cycles": 0}
+
+    def get_schema(self, schema_id):
+        if schema_id in self.schemas:
+            return self.schemas[schema_id]
+        if schema_id in self.loaded:
+            return self.loaded[schema_id]
+        if schema_id in self.not_found:
+            return None
+        # Check if the schema can be found in the schemas storage
+        self.stats["loaded"] += 1
+        schema = self.load_schema(schema_id)
+        if schema:
+            self.loaded[schema_id] = schema
+            return schema
+        self.not_found.add(schema_id)
+        return None
+
+    def get_closure(self, schema):
+        # Returns the IDs of the referenced schemas in the order they are found and the references not found
+        root = schema.get("$id")
+        self.stats["resolved"] += 1
+        if root in self.closures:
+            self.stats["memoized"] += 1
+            return self.closures[root]
+        closure_ids = []
+        not_found = []
+        visited = {root}
+        # Depth first without recursion, the path is kept to detect references back to a schema being resolved
+        path = [root]
+        stack = [iter(get_external_refs(schema))]
+        while stack:
+            ref = next(stack[-1], None)
+            if ref is None:
+                stack.pop()
+                path.pop()
+                continue
+            if ref in path:
+                # A schema referring to its own definitions by its $id is not a cycle
+                if ref != path[-1]:
+                    self.stats["cycles"] += 1
+                    logging.info(f"Schema {path[-1]} refers back to {ref}, the cycle is not followed")
+                continue
+            if ref in visited:
+                continue
+            visited.add(ref)
+            if ref in self.closures:
+                # The closure of a schema is complete, so it is taken over instead of walked again
+                ref_closure_ids, ref_not_found = self.closures[ref]
+                closure_ids.append(ref)
+                for schema_id in ref_closure_ids:
+                    if schema_id not in visited:
+                        visited.add(schema_id)
+                        closure_ids.append(schema_id)
+                for schema_id in ref_not_found:
+                    if schema_id not in visited:
+                        visited.add(schema_id)
+                        not_found.append(schema_id)
+                continue
+            referenced_schema = self.get_schema(ref)
+            if referenced_schema is None:
+                not_found.append(ref)
+                continue
+            closure_ids.append(ref)
+            path.append(ref)
+            stack.append(iter(get_external_refs(referenced_schema)))
+        if root is not None:
+            self.closures[root] = (closure_ids, not_found)
+        return closure_ids, not_found
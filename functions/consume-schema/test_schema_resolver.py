@@ -0,0 +1,62 @@
+import os
+import sys
+import types
+import unittest
+
+try:
+    import config  # noqa: F401
+except ImportError:
+    # The resolver does not need the configuration of a deployment
+    sys.modules["config"] = types.ModuleType("config")
+
+# Modules shared by the functions, like check_storage.py, are deployed along with the function
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from schema_resolver import SchemaResolver  # noqa: E402
+
+
+class SchemaResolverTest(unittest.TestCase):
+    # Closures memoized by a warm instance are resolved again when a schema in them changes
+
+    def setUp(self):
+        self.stored_schemas = {"s/c": {"$id": "s/c"}}
+        self.resolver = SchemaResolver(self.stored_schemas.get)
+
+    def test_changed_reference_of_root(self):
+        self.resolver.index([{"$id": "s/a", "$ref": "s/b"}, {"$id": "s/b"}])
+        self.assertEqual(self.resolver.get_closure(self.resolver.schemas["s/a"]), (["s/b"], []))
+
+        # The next message refers A to C instead of B
+        self.resolver.index([{"$id": "s/a", "$ref": "s/c"}])
+        self.assertEqual(self.resolver.get_closure(self.resolver.schemas["s/a"]), (["s/c"], []))
+
+    def test_new_reference_of_referenced_schema(self):
+        self.resolver.index([{"$id": "s/a", "$ref": "s/b"}, {"$id": "s/b"}])
+        self.assertEqual(self.resolver.get_closure(self.resolver.schemas["s/a"]), (["s/b"], []))
+
+        # The next message adds a reference from B to C, so A refers to C through B
+        self.resolver.index([{"$id": "s/b", "$ref": "s/c"}])
+        self.assertEqual(self.resolver.get_closure(self.resolver.schemas["s/a"]), (["s/b", "s/c"], []))
+
+    def test_stored_schema_is_loaded_again_for_every_message(self):
+        self.resolver.index([{"$id": "s/a", "$ref": "s/c"}])
+        self.assertEqual(self.resolver.get_closure(self.resolver.schemas["s/a"]), (["s/c"], []))
+
+        # C is updated in the schemas bucket, the next message does not carry it
+        self.stored_schemas.update({"s/c": {"$id": "s/c", "$ref": "s/d"}, "s/d": {"$id": "s/d"}})
+        self.resolver.index([])
+        self.assertNotIn("s/c", self.resolver.schemas)
+        self.assertEqual(self.resolver.get_closure(self.resolver.schemas["s/a"]), (["s/c", "s/d"], []))
+        self.assertEqual(self.resolver.stats["loaded"], 3)
+
+    def test_unchanged_closure_is_memoized(self):
+        self.resolver.index([{"$id": "s/a", "$ref": "s/b"}, {"$id": "s/b"}])
+        self.resolver.get_closure(self.resolver.schemas["s/a"])
+
+        self.resolver.index([{"$id": "s/a", "$ref": "s/b"}, {"$id": "s/d"}])
+        self.assertEqual(self.resolver.get_closure(self.resolver.schemas["s/a"]), (["s/b"], []))
+        self.assertEqual(self.resolver.stats["memoized"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import os
+import sys
+import threading
+import types
+import unittest
+
+try:
+    import config  # noqa: F401
+except ImportError:
+    # The processor falls back to its defaults without the configuration of a deployment
+    sys.modules["config"] = types.ModuleType("config")
+
+# Modules shared by the functions, like check_storage.py, are deployed along with the function
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ckanprocessor import CKANProcessor  # noqa: E402
+from patch_executor import PatchExecutor  # noqa: E402
+from schema_resolver import SchemaResolver  # noqa: E402
+
+
+class FakeAction(object):
+    # Stores the patched schemas on the resources, like resource_patch of CKAN
+
+    def __init__(self, resources):
+        self.resources = {resource['id']: resource for resource in resources}
+
+    def resource_patch(self, **resource_dict):
+        self.resources[resource_dict['id']]['schemas'] = resource_dict['schemas']
+
+
+class StorageFormatTest(unittest.TestCase):
+    # Resources are patched again when the storage format changes, also when their schemas did not
+
+    def setUp(self):
+        self.schemas = [{"$id": "s/a", "$ref": "s/b"}, {"$id": "s/b", "type": "object"}]
+        self.resources = [
+            {'id': schema_id, 'package_id': 'p', 'name': schema_id, 'url': '', 'schema_tag': schema_id}
+            for schema_id in ("s/a", "s/b")
+        ]
+        self.action = FakeAction(self.resources)
+
+    def make_processor(self, storage_format):
+        processor = CKANProcessor.__new__(CKANProcessor)
+        processor.host = types.SimpleNamespace(action=self.action)
+        processor.resolver = SchemaResolver(lambda schema_id: None)
+        processor.storage_format = storage_format
+        processor.patch_lock = threading.Lock()
+        processor.patch_executor = PatchExecutor(1, 60 * 60)
+        return processor
+
+    def run_message(self, processor):
+        processor.resolver.index(self.schemas)
+        processor.serialized_schemas = {}
+        processor.patch_stats = {'applied': 0, 'skipped': 0, 'failed': 0}
+        processor.pending_patches = []
+        resources_by_tag = CKANProcessor.index_resources(self.resources)
+        for schema in self.schemas:
+            processor.schema_to_ckan(schema, resources_by_tag)
+        processor.patch_executor.run(processor.write_resource, processor.pending_patches)
+        return processor.patch_stats
+
+    def test_same_format_is_skipped(self):
+        processor = self.make_processor('pretty')
+        self.assertEqual(self.run_message(processor)['applied'], 2)
+        self.assertEqual(self.run_message(processor), {'applied': 0, 'skipped': 2, 'failed': 0})
+
+    def test_switched_format_is_patched(self):
+        self.run_message(self.make_processor('pretty'))
+
+        stats = self.run_message(self.make_processor('compact'))
+        self.assertEqual(stats, {'applied': 2, 'skipped': 0, 'failed': 0})
+        self.assertEqual(self.action.resources["s/b"]['schemas'], ['{"$id":"s/b","type":"object"}'])
+
+        # Switching back patches them again as well
+        stats = self.run_message(self.make_processor('pretty'))
+        self.assertEqual(stats, {'applied': 2, 'skipped': 0, 'failed': 0})
+
+
+if __name__ == "__main__":
+    unittest.main()
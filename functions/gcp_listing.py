@@ -0,0 +1,109 @@
+import config
+
+
+class ResourceLister(object):
+    # Lists only the short names of a project's resources, page by page
+
+    def __init__(
+            self,
+            su_client,
+            publisher_client,
+            subscriber_client,
+            stg_client,
+            bq_client,
+            sql_client,
+            rate_limiter,
+    ):
+        self.su_client = su_client
+        self.publisher_client = publisher_client
+        self.subscriber_client = subscriber_client
+        self.stg_client = stg_client
+        self.bq_client = bq_client
+        self.sql_client = sql_client
+        self.rate_limiter = rate_limiter
+        self.page_size = getattr(config, "LIST_PAGE_SIZE", 1000)
+
+    def list_enabled_service_names(self, project_id):
+        services = self.su_client.services()
+        request = services.list(
+            parent=f"projects/{project_id}",
+            filter="state:ENABLED",
+            pageSize=200,  # Maximum page size of the Service Usage API
+            fields="services(config/name),nextPageToken",
+        )
+        for service in self.paginate("serviceusage", services, request, "services"):
+            yield service["config"]["name"]
+
+    def list_topic_names(self, project_id):
+        topics = self.publisher_client.list_topics(
+            request={"project": f"projects/{project_id}", "page_size": self.page_size}
+        )
+        for page in self.limit_pages("pubsub", topics.pages):
+            for topic in page.topics:
+                yield topic.name.split("/")[-1]
+
+    def list_subscription_names(self, project_id):
+        subscriptions = self.subscriber_client.list_subscriptions(
+            request={"project": f"projects/{project_id}", "page_size": self.page_size}
+        )
+        for page in self.limit_pages("pubsub", subscriptions.pages):
+            for subscription in page.subscriptions:
+                yield subscription.name.split("/")[-1]
+
+    def list_bucket_names(self, project_id):
+        # Storage already returns its maximum page size by default
+        buckets = self.stg_client.list_buckets(
+            project=project_id, fields="items(name),nextPageToken"
+        )
+        for page in self.limit_pages("storage", buckets.pages):
+            for bucket in page:
+                yield bucket.name
+
+    def list_dataset_ids(self, project_id):
+        datasets = self.bq_client.list_datasets(project=project_id)
+        datasets.extra_params.update(
+            {
+                "maxResults": self.page_size,
+                "fields": "datasets(datasetReference),nextPageToken",
+            }
+        )
+        for page in self.limit_pages("bigquery", datasets.pages):
+            for dataset in page:
+                yield dataset.dataset_id
+
+    def list_sql_instance_names(self, project_id):
+        instances = self.sql_client.instances()
+        request = instances.list(
+            project=project_id,
+            maxResults=self.page_size,
+            fields="items(name),nextPageToken",
+        )
+        for instance in self.paginate("sqladmin", instances, request):
+            yield instance["name"]
+
+    def list_sql_database_names(self, project_id, instance):
+        databases = self.sql_client.databases()
+        request = databases.list(project=project_id, instance=instance, fields="items(name)")
+        for database in self.paginate("sqladmin", databases, request):
+            yield database["name"]
+
+    def limit_pages(self, api, pages):
+        # Every page is a request, so a token is taken before fetching it
+        while True:
+            self.rate_limiter.acquire(api)
+            try:
+                page = next(pages)
+            except StopIteration:
+                return
+            yield page
+
+    def paginate(self, api, collection, request, items_key="items"):
+        # Follows the nextPageToken for collections that support paging
+        while request is not None:
+            self.rate_limiter.acquire(api)
+            response = request.execute()
+            for item in response.get(items_key, []):
+                yield item
+            if not hasattr(collection, "list_next"):
+                break
+            request = collection.list_next(request, response)
@@ -0,0 +1,489 @@
+import logging
+import re
+import threading
+
+import config
+import googleapiclient.discovery
+from asset_inventory import AssetInventory, make_empty_project
+from gcp_helper import GCPHelper
+from gcp_listing import ResourceLister
+from google.api_core.exceptions import BadRequest as GCP_BadRequest
+from google.api_core.exceptions import Forbidden as GCP_Forbidden
+from google.api_core.exceptions import NotFound as GCP_NotFound
+from google.cloud import bigquery, pubsub_v1, storage
+from googleapiclient.errors import HttpError as GCP_httperror
+from rate_limiter import get_rate_limiter
+from scan_report import ScanReport
+from service_cache import ServiceCache
+from state_store import get_state_store
+
+
+class GCPService:
+
+    def __init__(self, scan_report=None, clients=None):
+        self.scan_report = scan_report or ScanReport()
+        # Clients can be passed in, e.g. the fakes of the benchmark
+        self.credentials = None
+        if clients is None:
+            self.credentials = GCPHelper().request_auth_token()
+            clients = self.create_clients(self.credentials)
+        self.clients = clients
+        self.publisher_client = clients["publisher"]
+        self.subscriber_client = clients["subscriber"]
+        self.crm_client = clients["cloudresourcemanager"]
+        # The rate limiter is shared by all clients of the function
+        self.rate_limiter = get_rate_limiter()
+        self.service_cache = ServiceCache(get_state_store())
+        self.thread_local = threading.local()
+        self.thread_local.resource_lister = self.create_resource_lister(clients)
+        self.asset_inventory = None
+        if self.get_inventory_backend() == "asset_inventory":
+            self.asset_inventory = AssetInventory(
+                clients["cloudasset"], self.rate_limiter, config.ASSET_SCOPE
+            )
+
+    @staticmethod
+    def create_http_clients(credentials):
+        # These clients are not safe to share between threads
+        return {
+            "storage": storage.Client(credentials=credentials),
+            "bigquery": bigquery.Client(credentials=credentials),
+            "serviceusage": googleapiclient.discovery.build(
+                "serviceusage", "v1", credentials=credentials, cache_discovery=False
+            ),
+            "sqladmin": googleapiclient.discovery.build(
+                "sqladmin", "v1beta4", credentials=credentials, cache_discovery=False
+            ),
+        }
+
+    @classmethod
+    def create_clients(cls, credentials):
+        clients = cls.create_http_clients(credentials)
+        clients.update(
+            {
+                "publisher": pubsub_v1.PublisherClient(credentials=credentials),
+                "subscriber": pubsub_v1.SubscriberClient(credentials=credentials),
+                "cloudresourcemanager": googleapiclient.discovery.build(
+                    "cloudresourcemanager", "v1", credentials=credentials, cache_discovery=False
+                ),
+            }
+        )
+        if cls.get_inventory_backend() == "asset_inventory":
+            clients["cloudasset"] = googleapiclient.discovery.build(
+                "cloudasset", "v1", credentials=credentials, cache_discovery=False
+            )
+        return clients
+
+    @staticmethod
+    def get_inventory_backend():
+        # Either 'listing' (every resource type per project) or 'asset_inventory' (Cloud Asset API searches)
+        return getattr(config, "INVENTORY_BACKEND", "listing")
+
+    def create_resource_lister(self, clients):
+        return ResourceLister(
+            clients["serviceusage"],
+            self.publisher_client,
+            self.subscriber_client,
+            clients["storage"],
+            clients["bigquery"],
+            clients["sqladmin"],
+            self.rate_limiter,
+        )
+
+    @property
+    def resource_lister(self):
+        # Every scanning thread lists with its own HTTP clients, the Pub/Sub clients are shared
+        resource_lister = getattr(self.thread_local, "resource_lister", None)
+        if resource_lister is None:
+            clients = self.clients
+            if self.credentials is not None:
+                clients = self.create_http_clients(self.credentials)
+            resource_lister = self.create_resource_lister(clients)
+            self.thread_local.resource_lister = resource_lister
+        return resource_lister
+
+    def get_project_services(self, group_project_id):
+        if self.asset_inventory is not None:
+            project = self.asset_inventory.get_project(group_project_id)
+            return project["services"] if project else []
+        # Enabled services rarely change, so they are cached
+        services = self.service_cache.get(group_project_id)
+        if services is not None:
+            return services
+        try:
+            with self.scan_report.measure(group_project_id, "gcp", "services"):
+                services = self.list_names(
+                    "serviceusage", self.resource_lister.list_enabled_service_names, group_project_id
+                )
+        except GCP_httperror as e:
+            logging.info(
+                f"Getting services from project with project ID {group_project_id} resulted in error {e}"
+            )
+            return []
+        self.service_cache.put(group_project_id, services)
+        return services
+
+    def refresh_project_services(self, group_project_id):
+        # Services served from the cache may be older than an API enabled since, returns whether they were fetched again
+        if self.asset_inventory is not None or not self.service_cache.was_served(group_project_id):
+            return False
+        logging.info(f"Fetching the cached services of project ID {group_project_id} again")
+        self.service_cache.invalidate(group_project_id)
+        self.get_project_services(group_project_id)
+        return True
+
+    def invalidate_project_services(self, group_project_id):
+        self.service_cache.invalidate(group_project_id)
+
+    def skip_forbidden_listing(self, group_project_id, resource_type, error):
+        # The cached services may claim the API is still enabled, or the access to the project was revoked
+        # Returns None, the resources of the type are unknown and not compared instead of reported as missing
+        self.invalidate_project_services(group_project_id)
+        logging.info(
+            f"Listing {resource_type} of project ID {group_project_id} is not permitted, it is skipped: {error}"
+        )
+        return None
+
+    def list_names(self, api, list_function, *args):
+        # The listing is restarted when the quota of the API is exhausted halfway
+        return self.rate_limiter.retry(api, lambda: list(list_function(*args)))
+
+    def get_subscriptions(
+            self, not_found_resource, gcp_services, not_found_resources, group_project_id
+    ):
+        subscriptions = []
+        # Check if project has pubsub service
+        if "pubsub.googleapis.com" not in gcp_services:
+            return not_found_resources, subscriptions
+        try:
+            subscriptions.extend(
+                self.list_names(
+                    "pubsub", self.resource_lister.list_subscription_names, group_project_id
+                )
+            )
+        except GCP_NotFound:
+            logging.info(
+                f"Project ID {group_project_id} could not be found on GCP while getting subscriptions"
+            )
+            self.invalidate_project_services(group_project_id)
+            resource_url = f"https://console.cloud.google.com/home/dashboard?project={group_project_id}"
+            not_found_resources.append(
+                not_found_resource.make_not_found(
+                    "Project not found",
+                    "google-cloud-project",
+                    group_project_id,
+                    "GCP Project",
+                    resource_url,
+                )
+            )
+        except GCP_Forbidden as e:
+            # Pub/Sub raises PermissionDenied, a subclass of Forbidden
+            subscriptions = self.skip_forbidden_listing(group_project_id, "subscriptions", e)
+        return not_found_resources, subscriptions
+
+    def get_topics(
+            self, not_found_resource, gcp_services, not_found_resources, group_project_id
+    ):
+        topics = []
+        # Check if project has pubsub service
+        if "pubsub.googleapis.com" not in gcp_services:
+            return not_found_resources, topics
+        try:
+            topics.extend(
+                self.list_names("pubsub", self.resource_lister.list_topic_names, group_project_id)
+            )
+        except GCP_NotFound:
+            logging.info(
+                f"Project ID {group_project_id} could not be found on GCP while getting topics"
+            )
+            self.invalidate_project_services(group_project_id)
+            resource_url = f"https://console.cloud.google.com/home/dashboard?project={group_project_id}"
+            not_found_resources.append(
+                not_found_resource.make_not_found(
+                    "Project not found",
+                    "google-cloud-project",
+                    group_project_id,
+                    "GCP Project",
+                    resource_url,
+                )
+            )
+        except GCP_Forbidden as e:
+            topics = self.skip_forbidden_listing(group_project_id, "topics", e)
+        return not_found_resources, topics
+
+    def get_buckets(
+            self, not_found_resource, gcp_services, not_found_resources, group_project_id
+    ):
+        buckets = []
+        # Check if project has storage service
+        if "storage-api.googleapis.com" not in gcp_services:
+            return not_found_resources, buckets
+        try:
+            buckets.extend(
+                self.list_names("storage", self.resource_lister.list_bucket_names, group_project_id)
+            )
+        except GCP_NotFound:
+            logging.info(
+                f"Project ID {group_project_id} could not be found on GCP while getting buckets"
+            )
+            self.invalidate_project_services(group_project_id)
+            resource_url = f"https://console.cloud.google.com/home/dashboard?project={group_project_id}"
+            not_found_resources.append(
+                not_found_resource.make_not_found(
+                    "Project not found",
+                    "google-cloud-project",
+                    group_project_id,
+                    "GCP Project",
+                    resource_url,
+                )
+            )
+        except GCP_Forbidden as e:
+            buckets = self.skip_forbidden_listing(group_project_id, "buckets", e)
+        return not_found_resources, buckets
+
+    def get_sql_instances(
+            self, not_found_resource, gcp_services, not_found_resources, group_project_id
+    ):
+        instances = []
+        # Check if project has sql service
+        if "sqladmin.googleapis.com" not in gcp_services:
+            return not_found_resources, instances
+        try:
+            instances.extend(
+                self.list_names(
+                    "sqladmin", self.resource_lister.list_sql_instance_names, group_project_id
+                )
+            )
+        except GCP_NotFound:
+            logging.info(
+                f"Project ID {group_project_id} could not be found on GCP while getting SQL instances"
+            )
+            self.invalidate_project_services(group_project_id)
+            resource_url = f"https://console.cloud.google.com/home/dashboard?project={group_project_id}"
+            not_found_resources.append(
+                not_found_resource.make_not_found(
+                    "Project not found",
+                    "google-cloud-project",
+                    group_project_id,
+                    "GCP Project",
+                    resource_url,
+                )
+            )
+        except GCP_httperror as e:
+            # Cloud SQL answers with an HTTP 403
+            if e.resp.status != 403:
+                raise
+            instances = self.skip_forbidden_listing(group_project_id, "SQL instances", e)
+        return not_found_resources, instances
+
+    def get_sql_databases(
+            self,
+            not_found_resource,
+            gcp_services,
+            instances,
+            not_found_resources,
+            group_project_id,
+    ):
+        resources = []
+        # Check if project has sql service
+        if "sqladmin.googleapis.com" not in gcp_services:
+            return not_found_resources, resources
+        # Without the instances their databases are unknown too
+        if instances is None:
+            return not_found_resources, None
+        for instance in instances:
+            try:
+                resources.extend(
+                    self.list_names(
+                        "sqladmin",
+                        self.resource_lister.list_sql_database_names,
+                        group_project_id,
+                        instance,
+                    )
+                )
+            except GCP_NotFound:
+                logging.info(
+                    f"Project ID {group_project_id} could not be found on GCP while getting SQL databases"
+                )
+                self.invalidate_project_services(group_project_id)
+                resource_url = f"https://console.cloud.google.com/home/dashboard?project={group_project_id}"
+                not_found_resources.append(
+                    not_found_resource.make_not_found(
+                        "Project not found",
+                        "google-cloud-project",
+                        group_project_id,
+                        "GCP Project",
+                        resource_url,
+                    )
+                )
+            except GCP_httperror as e:
+                if e.resp.status != 403:
+                    raise
+                return not_found_resources, self.skip_forbidden_listing(group_project_id, "SQL databases", e)
+        return not_found_resources, resources
+
+    def get_bigquery_datasets(
+            self, not_found_resource, gcp_services, not_found_resources, group_project_id
+    ):
+        datasets = []
+        # Check if project has bigquery service
+        if "bigquery.googleapis.com" not in gcp_services:
+            return not_found_resources, datasets
+        try:
+            datasets.extend(
+                self.list_names("bigquery", self.resource_lister.list_dataset_ids, group_project_id)
+            )
+        except GCP_NotFound:
+            logging.info(
+                f"Project ID {group_project_id} could not be found on GCP while getting bigquery datasets"
+            )
+            self.invalidate_project_services(group_project_id)
+            resource_url = f"https://console.cloud.google.com/home/dashboard?project={group_project_id}"
+            not_found_resources.append(
+                not_found_resource.make_not_found(
+                    "Project not found",
+                    "google-cloud-project",
+                    group_project_id,
+                    "GCP Project",
+                    resource_url,
+                )
+            )
+        except GCP_Forbidden as e:
+            datasets = self.skip_forbidden_listing(group_project_id, "bigquery datasets", e)
+        except GCP_BadRequest as e:
+            logging.info(
+                f"Listing services of Project ID {group_project_id} resulted in bigquery API but an error occured: {e}"
+            )
+        return not_found_resources, datasets
+
+    def get_project_inventory(
+            self, not_found_resource, gcp_services, not_found_resources, group_project_id
+    ):
+        # Get all checked resources belonging to project ID, keyed by CKAN resource format
+        if self.asset_inventory is not None:
+            return self.get_asset_inventory(
+                not_found_resource, gcp_services, not_found_resources, group_project_id
+            )
+        with self.scan_report.measure(group_project_id, "gcp", "topic"):
+            not_found_resources, topics = self.get_topics(
+                not_found_resource, gcp_services, not_found_resources, group_project_id
+            )
+        with self.scan_report.measure(group_project_id, "gcp", "subscription"):
+            not_found_resources, subscriptions = self.get_subscriptions(
+                not_found_resource, gcp_services, not_found_resources, group_project_id
+            )
+        with self.scan_report.measure(group_project_id, "gcp", "blob-storage"):
+            not_found_resources, buckets = self.get_buckets(
+                not_found_resource, gcp_services, not_found_resources, group_project_id
+            )
+        with self.scan_report.measure(group_project_id, "gcp", "cloudsql-instance"):
+            not_found_resources, sql_instances = self.get_sql_instances(
+                not_found_resource, gcp_services, not_found_resources, group_project_id
+            )
+        with self.scan_report.measure(group_project_id, "gcp", "cloudsql-db"):
+            not_found_resources, sql_databases = self.get_sql_databases(
+                not_found_resource,
+                gcp_services,
+                sql_instances,
+                not_found_resources,
+                group_project_id,
+            )
+        with self.scan_report.measure(group_project_id, "gcp", "bigquery-dataset"):
+            not_found_resources, bigquery_datasets = self.get_bigquery_datasets(
+                not_found_resource, gcp_services, not_found_resources, group_project_id
+            )
+        inventory = {
+            "topic": topics,
+            "subscription": subscriptions,
+            "blob-storage": buckets,
+            "cloudsql-instance": sql_instances,
+            "cloudsql-db": sql_databases,
+            "bigquery-dataset": bigquery_datasets,
+        }
+        return not_found_resources, inventory
+
+    def get_asset_inventory(
+            self, not_found_resource, gcp_services, not_found_resources, group_project_id
+    ):
+        with self.scan_report.measure(group_project_id, "gcp", "assets"):
+            project = self.asset_inventory.get_project(group_project_id) or make_empty_project()
+        # Cloud SQL databases are not searchable assets, they are still listed per instance
+        with self.scan_report.measure(group_project_id, "gcp", "cloudsql-db"):
+            not_found_resources, sql_databases = self.get_sql_databases(
+                not_found_resource,
+                gcp_services,
+                project["cloudsql-instance"],
+                not_found_resources,
+                group_project_id,
+            )
+        # Same shape and order as the inventory of the listings
+        inventory = {
+            "topic": list(project["topic"]),
+            "subscription": list(project["subscription"]),
+            "blob-storage": list(project["blob-storage"]),
+            "cloudsql-instance": list(project["cloudsql-instance"]),
+            "cloudsql-db": sql_databases,
+            "bigquery-dataset": list(project["bigquery-dataset"]),
+        }
+        return not_found_resources, inventory
+
+    def get_subscriber_client(self):
+        return self.subscriber_client
+
+    def close(self):
+        self.subscriber_client.close()
+        self.rate_limiter.log_stats()
+        self.service_cache.save()
+
+    def get_projects(self):
+        # Streams the IDs of the active projects of the environment while the pages are listed
+        project_filter = getattr(config, "PROJECT_FILTER", None) or self.get_default_project_filter()
+        project_pattern = self.get_project_pattern()
+        projects = self.crm_client.projects()
+        request = projects.list(
+            filter=project_filter,
+            pageSize=self.resource_lister.page_size,
+            fields="projects(projectId,lifecycleState),nextPageToken",
+        )
+        while request is not None:
+            try:
+                response = self.rate_limiter.call("cloudresourcemanager", request.execute)
+            except GCP_httperror as e:
+                logging.info(
+                    f"Getting GCP projects resulted in error {e}"
+                )
+                return
+            for project in response.get("projects", []):
+                project_id = project.get("projectId", "")
+                # The server side filter is checked again, a broader PROJECT_FILTER should not widen the check
+                if project.get("lifecycleState") == "ACTIVE" and project_pattern.match(project_id):
+                    yield project_id
+            request = projects.list_next(request, response)
+
+    @staticmethod
+    def get_environment():
+        # The environment is derived from the topic name, e.g. 'prefix-p-topic' results in ('prefix', 'p')
+        topic_name = config.TOPIC_NAME
+        env = re.search('-[p|d]-', topic_name)[0]
+        prefix = topic_name.partition(env)[0]
+        env = env.replace('-', '')
+        return prefix, env
+
+    def get_default_project_filter(self):
+        prefix, env = self.get_environment()
+        return f"id:{prefix}-{env}-* lifecycleState:ACTIVE"
+
+    def get_project_pattern(self):
+        prefix, env = self.get_environment()
+        return re.compile("{}-{}-*".format(prefix, env))
+
+    def generate_resource_url(self, resource_type, name, project_id):
+        base_url = 'https://console.cloud.google.com'
+        return {
+            'topic': f'{base_url}/cloudpubsub/topic/detail/{name}?project={project_id}',
+            'subscription': f'{base_url}/cloudpubsub/subscription/detail/{name}?project={project_id}',
+            'blob-storage': f'{base_url}/storage/browser/{name}?project={project_id}',
+            'cloudsql-instance': f'{base_url}/sql/instances/{name}?project={project_id}',
+            'cloudsql-db': f'{base_url}/sql/databases/{name}?project={project_id}',
+            'bigquery-dataset': f'{base_url}/bigquery/{name}?project={project_id}',
+        }.get(resource_type, '')
@@ -10,8 +10,6 @@ class NotFoundResource(object):
     def make_not_found(
             self, message, package_name, resource_name, resource_type, resource_url
     ):
-        timezone = pytz.timezone("Europe/Amsterdam")
-        timestamp = datetime.datetime.now(tz=timezone)
         not_found_dict = {
             "message": message,
             "project_id": self.group_project_id,
@@ -19,6 +17,12 @@ class NotFoundResource(object):
             "resource_name": resource_name,
             "type": resource_type,
             "access_url": resource_url,
-            "timestamp": timestamp.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+            "timestamp": self.get_timestamp(),
         }
         return not_found_dict
+
+    @staticmethod
+    def get_timestamp():
+        timezone = pytz.timezone("Europe/Amsterdam")
+        timestamp = datetime.datetime.now(tz=timezone)
+        return timestamp.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
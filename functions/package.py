@@ -3,6 +3,19 @@ import logging
 import requests
 from not_found_resource import NotFoundResource
 
+# The API the resources of a format belong to, they cannot be found while it is not enabled
+FORMAT_SERVICES = {
+    "topic": "pubsub.googleapis.com",
+    "subscription": "pubsub.googleapis.com",
+    "blob-storage": "storage-api.googleapis.com",
+    "cloudsql-instance": "sqladmin.googleapis.com",
+    "cloudsql-db": "sqladmin.googleapis.com",
+    "bigquery-dataset": "bigquery.googleapis.com",
+    "datastore": "datastore.googleapis.com",
+    "datastore-index": "datastore.googleapis.com",
+    "firestore": "firestore.googleapis.com",
+}
+
 
 class Package(object):
     def __init__(
@@ -69,6 +82,20 @@ class Package(object):
 
     def check_resource_format(self, resource_format, resource_name, resource):
         success = False
+        # The resources of a type that could not be listed are unknown, so they are not compared
+        listed_resources = {
+            "subscription": self.subscriptions,
+            "topic": self.topics,
+            "blob-storage": self.buckets,
+            "cloudsql-instance": self.sql_instances,
+            "cloudsql-db": self.sql_databases,
+            "bigquery-dataset": self.bigquery_datasets,
+        }
+        if resource_format in listed_resources and listed_resources[resource_format] is None:
+            logging.info(
+                f"Skipping resource '{resource_name}', the {resource_format} resources of the project could not be listed"
+            )
+            return "continue"
         if resource_format == "subscription":
             success = self.check_subscriptions(resource_name)
         elif resource_format == "topic":
@@ -83,10 +110,8 @@ class Package(object):
             success = self.check_list(resource_name, self.bigquery_datasets)
         elif resource_format == "API":
             success = self.check_api(resource)
-        elif resource_format in ["datastore", "datastore-index"]:
-            success = self.check_service("datastore.googleapis.com")
-        elif resource_format == "firestore":
-            success = self.check_service("firestore.googleapis.com")
+        elif resource_format in ["datastore", "datastore-index", "firestore"]:
+            success = self.check_service(FORMAT_SERVICES[resource_format])
         else:
             logging.debug(
                 f"Skipping resource '{resource_name}' with format '{resource['format']}'"
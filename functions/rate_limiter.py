@@ -0,0 +1,122 @@
+import logging
+import random
+import threading
+import time
+
+import config
+from google.api_core.exceptions import Forbidden as GCP_Forbidden
+from google.api_core.exceptions import ResourceExhausted as GCP_ResourceExhausted
+from google.api_core.exceptions import TooManyRequests as GCP_TooManyRequests
+from googleapiclient.errors import HttpError as GCP_httperror
+from token_bucket import TokenBucket
+
+# Requests per minute per API, can be overridden with API_QUOTAS in the config
+DEFAULT_API_QUOTAS = {
+    "bigquery": 600,
+    "cloudasset": 400,
+    "cloudresourcemanager": 600,
+    "pubsub": 600,
+    "serviceusage": 240,
+    "sqladmin": 180,
+    "storage": 600,
+}
+
+# Reasons of a 403 that is an exhausted quota instead of a missing permission
+QUOTA_REASONS = ("RESOURCE_EXHAUSTED", "rateLimitExceeded", "userRateLimitExceeded", "quotaExceeded")
+
+
+class QuotaExhausted(Exception):
+    pass
+
+
+def is_quota_error(error):
+    if isinstance(error, (GCP_TooManyRequests, GCP_ResourceExhausted)):
+        return True
+    if isinstance(error, GCP_httperror):
+        if error.resp.status == 429:
+            return True
+        content = error.content
+        if isinstance(content, bytes):
+            content = content.decode("utf-8", "ignore")
+        return error.resp.status == 403 and any(reason in content for reason in QUOTA_REASONS)
+    if isinstance(error, GCP_Forbidden):
+        # BigQuery and Cloud Storage answer with a 403 whose errors carry the reason
+        reasons = [item.get("reason") for item in error.errors if isinstance(item, dict)]
+        return any(reason in QUOTA_REASONS for reason in reasons) or any(
+            reason in str(error) for reason in QUOTA_REASONS
+        )
+    return False
+
+
+class RateLimiter(object):
+    def __init__(self):
+        api_quotas = dict(DEFAULT_API_QUOTAS)
+        api_quotas.update(getattr(config, "API_QUOTAS", {}))
+        self.buckets = {api: TokenBucket(quota) for api, quota in api_quotas.items()}
+        self.max_retries = getattr(config, "QUOTA_MAX_RETRIES", 5)
+        self.backoff_seconds = getattr(config, "QUOTA_BACKOFF_SECONDS", 2)
+        self.max_backoff_seconds = getattr(config, "QUOTA_MAX_BACKOFF_SECONDS", 60)
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def get_stats(self, api):
+        with self.lock:
+            return self.stats.setdefault(
+                api, {"requests": 0, "throttled": 0, "waited_seconds": 0.0}
+            )
+
+    def acquire(self, api):
+        waited = self.buckets[api].acquire()
+        stats = self.get_stats(api)
+        with self.lock:
+            stats["requests"] += 1
+            stats["waited_seconds"] += waited
+
+    def retry(self, api, function, *args, **kwargs):
+        # Retries the function with exponential backoff while the API quota is exhausted
+        for attempt in range(self.max_retries + 1):
+            try:
+                return function(*args, **kwargs)
+            except Exception as e:
+                if not is_quota_error(e):
+                    raise
+                stats = self.get_stats(api)
+                with self.lock:
+                    stats["throttled"] += 1
+                if attempt == self.max_retries:
+                    raise QuotaExhausted(
+                        f"Quota of {api} still exhausted after {self.max_retries} retries: {e}"
+                    )
+                delay = min(self.max_backoff_seconds, self.backoff_seconds * 2 ** attempt)
+                delay *= random.uniform(0.5, 1.0)  # nosec
+                logging.info(f"Quota of {api} exhausted, retrying in {delay:.1f} seconds")
+                time.sleep(delay)
+
+    def call(self, api, function, *args, **kwargs):
+        # For single requests, a token is taken for every attempt
+        def limited_function():
+            self.acquire(api)
+            return function(*args, **kwargs)
+
+        return self.retry(api, limited_function)
+
+    def log_stats(self):
+        with self.lock:
+            for api, stats in sorted(self.stats.items()):
+                logging.info(
+                    f"API {api}: {stats['requests']} requests, {stats['throttled']} throttled, "
+                    f"{stats['waited_seconds']:.1f} seconds waited on the rate limit"
+                )
+
+
+rate_limiter = None
+rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    # One limiter per process, so every client shares the same quota
+    global rate_limiter
+    with rate_limiter_lock:
+        if rate_limiter is None:
+            rate_limiter = RateLimiter()
+        return rate_limiter
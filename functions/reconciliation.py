@@ -0,0 +1,179 @@
+import logging
+import time
+
+from ckan_index import CKANResourceIndex
+from not_found_resource import NotFoundResource
+from package import FORMAT_SERVICES, Package
+
+
+class ReconciliationEngine(object):
+    # Fetches both sides of a project once, the drift is computed in both directions from the same data
+    # CKAN to GCP: resources documented on CKAN that do not exist on GCP (check-catalog-existence)
+    # GCP to CKAN: resources existing on GCP that are not documented on CKAN (check-gcp-existence)
+
+    def __init__(self, gcp_service, ckan_service, scan_report, resource_filter):
+        self.gcp_service = gcp_service
+        self.ckan_service = ckan_service
+        self.scan_report = scan_report
+        self.resource_filter = resource_filter
+        # When set, the CKAN side is served from the organization-wide catalog index
+        self.catalog_index = None
+
+    def get_gcp_side(self, project_id):
+        started = time.monotonic()
+        # Get project's services
+        gcp_services = self.gcp_service.get_project_services(project_id)
+        # Get topics, subscriptions, buckets, SQL instances and databases and bigquery datasets
+        not_found_resources, inventory = self.gcp_service.get_project_inventory(
+            NotFoundResource(project_id), gcp_services, [], project_id
+        )
+        return {
+            "services": gcp_services,
+            "inventory": inventory,
+            "not_found_resources": not_found_resources,
+            "seconds": time.monotonic() - started,
+        }
+
+    def refresh_gcp_side(self, project_id):
+        # Returns the GCP side with the services fetched again, None when they were not served from the cache
+        if not self.gcp_service.refresh_project_services(project_id):
+            return None
+        return self.get_gcp_side(project_id)
+
+    @staticmethod
+    def has_missing_services(gcp_side, not_found_resources):
+        # Whether the findings include a project without services or a resource whose API is not enabled
+        for not_found_resource in not_found_resources:
+            if not gcp_side["services"]:
+                return True
+            service = FORMAT_SERVICES.get(not_found_resource["type"])
+            if service and service not in gcp_side["services"]:
+                return True
+        return False
+
+    def get_group(self, project_id):
+        with self.scan_report.measure(project_id, "ckan", "group_show"):
+            return self.ckan_service.get_project_group(project_id)
+
+    def get_full_package(self, project_id, package_id):
+        with self.scan_report.measure(project_id, "ckan", "package_show"):
+            return self.ckan_service.get_full_package(package_id)
+
+    def get_ckan_side(self, project_id):
+        if self.catalog_index is not None:
+            return {
+                "group": None,
+                "packages": [],
+                "package_count": self.catalog_index.get_package_count(project_id),
+                "index": self.catalog_index.get_resource_index(project_id),
+                "resources": self.catalog_index.get_resource_count(project_id),
+                "seconds": 0.0,
+            }
+        started = time.monotonic()
+        group = self.get_group(project_id)
+        packages = [
+            self.get_full_package(project_id, package["id"])
+            for package in group.get("packages", [])
+        ]
+        return self.make_ckan_side(group, packages, time.monotonic() - started)
+
+    @staticmethod
+    def make_ckan_side(group, packages, seconds):
+        # Index the ckan resources once, so every GCP resource is looked up in constant time
+        ckan_index = CKANResourceIndex()
+        for package in packages:
+            ckan_index.add_package(package)
+        return {
+            "group": group,
+            "packages": packages,
+            "package_count": len(packages),
+            "index": ckan_index,
+            "resources": sum(len(package.get("resources", [])) for package in packages),
+            "seconds": seconds,
+        }
+
+    @staticmethod
+    def find_project_missing_on_gcp(project_id, gcp_side):
+        # If no gcp_services where found, the project does not exist
+        if gcp_side["services"]:
+            return []
+        logging.info(
+            f"Project ID {project_id} could not be found on GCP while getting services"
+        )
+        return [
+            NotFoundResource(project_id).make_not_found(
+                "Project not found",
+                "google-cloud-project",
+                project_id,
+                "GCP Project",
+                f"https://console.cloud.google.com/home/dashboard?project={project_id}",
+            )
+        ]
+
+    @staticmethod
+    def find_missing_on_gcp(project_id, gcp_side, package):
+        inventory = gcp_side["inventory"]
+        return Package(
+            package=package,
+            topics=inventory["topic"],
+            subscriptions=inventory["subscription"],
+            buckets=inventory["blob-storage"],
+            sql_instances=inventory["cloudsql-instance"],
+            sql_databases=inventory["cloudsql-db"],
+            bigquery_datasets=inventory["bigquery-dataset"],
+            gcp_services=gcp_side["services"],
+            group_project_id=project_id,
+        ).process()
+
+    @staticmethod
+    def find_projects_missing_on_ckan(project_ids):
+        not_found_resources = []
+        for project_id in project_ids:
+            logging.info(
+                f"Project ID {project_id} could not be found on CKAN while it still exists in GCP"
+            )
+            resource_url = f"https://console.cloud.google.com/home/dashboard?project={project_id}"
+            not_found_resources.append(
+                NotFoundResource(project_id).make_not_found(
+                    "Project not found",
+                    "google-cloud-project",
+                    project_id,
+                    "GCP Project",
+                    resource_url,
+                )
+            )
+        return not_found_resources
+
+    def find_missing_on_ckan(self, project_id, gcp_side, ckan_side):
+        not_found_resource = NotFoundResource(project_id)
+        ckan_index = ckan_side["index"]
+        not_found_resources = []
+        for key, value in gcp_side["inventory"].items():
+            # Resources of a type that could not be listed are unknown
+            for resource_name in value or []:
+                if ckan_index.contains(resource_name, key) or self.resource_filter.is_filtered(
+                        resource_name, key
+                ):
+                    continue
+                logging.info(
+                    f"Resource {resource_name} could not be found on CKAN while it still exists in GCP"
+                )
+                not_found_resources.append(
+                    not_found_resource.make_not_found(
+                        "Resource not found",
+                        '',  # package name is a ckan-specific attribute
+                        resource_name,
+                        key,
+                        self.gcp_service.generate_resource_url(key, resource_name, project_id),
+                    )
+                )
+        return not_found_resources
+
+    def record_project(self, project_id, gcp_side, ckan_side, packages=None, resources=None):
+        self.scan_report.record_project(
+            project_id,
+            ckan_side["seconds"] + gcp_side["seconds"],
+            packages=ckan_side["package_count"] if packages is None else packages,
+            resources=ckan_side["resources"] if resources is None else resources,
+            gcp_resources=sum(len(value or []) for value in gcp_side["inventory"].values()),
+        )
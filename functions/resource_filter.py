@@ -0,0 +1,85 @@
+import logging
+import re
+import threading
+from collections import Counter
+
+import config
+
+
+def make_pattern(entry):
+    # Entries are keywords matched anywhere in the name, unless anchored with a leading '^' or trailing '$'
+    anchored_start = entry.startswith("^")
+    anchored_end = entry.endswith("$") and len(entry) > 1
+    keyword = entry[1 if anchored_start else 0:-1 if anchored_end else None]
+    return f"{'^' if anchored_start else ''}{re.escape(keyword)}{'$' if anchored_end else ''}"
+
+
+class ResourceFilter(object):
+    # All filter entries of a resource type compiled into one regex, with the number of matches per entry
+
+    def __init__(self, default_filter, type_filters=None):
+        self.entries = []
+        self.labels = []
+        # Index per label, an entry listed twice is only compiled and counted once
+        self.indexes = {}
+        self.matchers = {}
+        default_indexes = self.add_entries(default_filter)
+        self.default_matcher = self.compile(default_indexes)
+        for resource_type, entries in (type_filters or {}).items():
+            indexes = default_indexes + self.add_entries(entries, f"{resource_type}:")
+            self.matchers[resource_type] = self.compile(indexes)
+        self.hits = Counter()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls):
+        return cls(
+            getattr(config, "DEFAULT_RESOURCE_FILTER", []),
+            getattr(config, "RESOURCE_TYPE_FILTERS", {}),
+        )
+
+    def add_entries(self, entries, label_prefix=""):
+        indexes = []
+        for entry in entries:
+            # An entry without a keyword, e.g. '^' or '$', would match every resource
+            if re.fullmatch(r"\^?\$?", entry):
+                logging.error(f"Resource filter entry '{entry}' has no keyword, it is ignored")
+                continue
+            label = f"{label_prefix}{entry}"
+            if label not in self.indexes:
+                self.indexes[label] = len(self.entries)
+                self.entries.append(entry)
+                self.labels.append(label)
+            if self.indexes[label] not in indexes:
+                indexes.append(self.indexes[label])
+        return indexes
+
+    def compile(self, indexes):
+        if not indexes:
+            return None
+        # The named group of every entry tells which one matched
+        return re.compile(
+            "|".join(f"(?P<entry{index}>{make_pattern(self.entries[index])})" for index in indexes)
+        )
+
+    def is_filtered(self, name, resource_type=None):
+        matcher = self.matchers.get(resource_type, self.default_matcher)
+        if matcher is None:
+            return False
+        match = matcher.search(name)
+        if match is None:
+            return False
+        with self.lock:
+            self.hits[int(match.lastgroup[len("entry"):])] += 1
+        return True
+
+    def get_stats(self):
+        with self.lock:
+            return {label: self.hits[index] for index, label in enumerate(self.labels)}
+
+    def log_stats(self):
+        stats = self.get_stats()
+        logging.info(f"Resource filter matches: {stats}")
+        unused_entries = [entry for entry, hits in stats.items() if not hits]
+        if unused_entries:
+            logging.info(f"Resource filter entries without matches: {unused_entries}")
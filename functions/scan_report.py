@@ -0,0 +1,109 @@
+import json
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+import config
+
+
+def percentile(durations, fraction):
+    # Nearest-rank percentile of the sorted durations
+    if not durations:
+        return 0.0
+    rank = max(1, int(math.ceil(fraction * len(durations))))
+    return durations[rank - 1]
+
+
+class ScanReport(object):
+    def __init__(self):
+        self.started = time.monotonic()
+        self.projects = {}
+        self.calls = {}
+        self.sections = {}
+        self.lock = threading.Lock()
+
+    def get_project(self, project_id):
+        return self.projects.setdefault(
+            project_id,
+            {
+                "seconds": 0.0,
+                "ckan_seconds": 0.0,
+                "gcp_seconds": 0.0,
+                "packages": 0,
+                "resources": 0,
+                "gcp_resources": 0,
+                "calls": {},
+            },
+        )
+
+    @contextmanager
+    def measure(self, project_id, side, call):
+        # Side is either 'ckan' or 'gcp', call is the request or resource type
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            seconds = time.monotonic() - started
+            call_name = f"{side}.{call}"
+            with self.lock:
+                project = self.get_project(project_id)
+                project[f"{side}_seconds"] += seconds
+                project["calls"][call_name] = project["calls"].get(call_name, 0.0) + seconds
+                self.calls.setdefault(call_name, []).append(seconds)
+
+    def record_project(self, project_id, seconds, packages=0, resources=0, gcp_resources=0):
+        with self.lock:
+            project = self.get_project(project_id)
+            project["seconds"] += seconds
+            project["packages"] += packages
+            project["resources"] += resources
+            project["gcp_resources"] += gcp_resources
+
+    def add_section(self, name, data):
+        # Additional statistics of the run, e.g. of an index it built
+        with self.lock:
+            self.sections[name] = data
+
+    def build(self):
+        slowest_count = getattr(config, "REPORT_SLOWEST_PROJECTS", 10)
+        with self.lock:
+            projects = sorted(
+                self.projects.items(), key=lambda item: item[1]["seconds"], reverse=True
+            )
+            calls = {}
+            for call_name, durations in sorted(self.calls.items()):
+                durations = sorted(durations)
+                calls[call_name] = {
+                    "calls": len(durations),
+                    "total_seconds": round(sum(durations), 3),
+                    "p50_seconds": round(percentile(durations, 0.5), 3),
+                    "p95_seconds": round(percentile(durations, 0.95), 3),
+                }
+            return {
+                "duration_seconds": round(time.monotonic() - self.started, 3),
+                "projects": len(self.projects),
+                "packages": sum(project["packages"] for _, project in projects),
+                "resources": sum(project["resources"] for _, project in projects),
+                "gcp_resources": sum(project["gcp_resources"] for _, project in projects),
+                "ckan_seconds": round(sum(project["ckan_seconds"] for _, project in projects), 3),
+                "gcp_seconds": round(sum(project["gcp_seconds"] for _, project in projects), 3),
+                "slowest_projects": [
+                    dict(
+                        project,
+                        project_id=project_id,
+                        seconds=round(project["seconds"], 3),
+                        ckan_seconds=round(project["ckan_seconds"], 3),
+                        gcp_seconds=round(project["gcp_seconds"], 3),
+                        calls={name: round(seconds, 3) for name, seconds in project["calls"].items()},
+                    )
+                    for project_id, project in projects[:slowest_count]
+                ],
+                "calls": calls,
+                **self.sections,
+            }
+
+    def emit(self):
+        # Logged as one structured line so it can be queried in Cloud Logging
+        logging.info(f"Scan report: {json.dumps(self.build())}")
@@ -0,0 +1,76 @@
+import logging
+import threading
+import time
+
+import config
+
+CACHE_NAME = "service_cache.json"
+
+
+class ServiceCache(object):
+    # Enabled services per project, kept between runs until they expire
+    def __init__(self, state_store):
+        self.state_store = state_store
+        self.ttl = getattr(config, "SERVICE_CACHE_TTL_SECONDS", 6 * 60 * 60)
+        self.entries = {}
+        if self.ttl > 0:
+            self.entries = self.state_store.load(CACHE_NAME) or {}
+        self.updated_project_ids = set()
+        self.invalidated_project_ids = set()
+        # Projects whose services were served from the cache instead of fetched by this instance
+        self.served_project_ids = set()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, project_id):
+        with self.lock:
+            entry = self.entries.get(project_id)
+            if entry and time.time() - entry["fetched_at"] < self.ttl:
+                self.hits += 1
+                self.served_project_ids.add(project_id)
+                return entry["services"]
+            self.misses += 1
+            return None
+
+    def put(self, project_id, services):
+        if self.ttl <= 0:
+            return
+        with self.lock:
+            self.entries[project_id] = {"services": services, "fetched_at": time.time()}
+            self.updated_project_ids.add(project_id)
+            self.invalidated_project_ids.discard(project_id)
+            self.served_project_ids.discard(project_id)
+
+    def invalidate(self, project_id):
+        with self.lock:
+            if self.entries.pop(project_id, None) is not None:
+                logging.info(f"Invalidated cached services of project ID {project_id}")
+            self.updated_project_ids.discard(project_id)
+            self.invalidated_project_ids.add(project_id)
+            self.served_project_ids.discard(project_id)
+
+    def was_served(self, project_id):
+        with self.lock:
+            return project_id in self.served_project_ids
+
+    def save(self):
+        if self.ttl <= 0 or not (self.updated_project_ids or self.invalidated_project_ids):
+            return
+        with self.lock:
+            logging.info(f"Service cache: {self.hits} hits, {self.misses} misses")
+            # Merge with the stored cache, other instances may have updated it in the meantime
+            entries = self.state_store.load(CACHE_NAME) or {}
+            for project_id in self.invalidated_project_ids:
+                entries.pop(project_id, None)
+            for project_id in self.updated_project_ids:
+                entries[project_id] = self.entries[project_id]
+            now = time.time()
+            entries = {
+                project_id: entry
+                for project_id, entry in entries.items()
+                if now - entry["fetched_at"] < self.ttl
+            }
+            self.state_store.save(CACHE_NAME, entries)
+            self.updated_project_ids = set()
+            self.invalidated_project_ids = set()
@@ -0,0 +1,102 @@
+import json
+import logging
+import uuid
+from collections import deque
+
+from google.cloud import pubsub_v1
+
+
+def make_shards(project_ids, shard_size):
+    # Sorted so every shard covers a stable range of projects, always at least one shard
+    project_ids = sorted(project_ids)
+    shards = [
+        project_ids[index:index + shard_size]
+        for index in range(0, len(project_ids), max(shard_size, 1))
+    ]
+    return shards or [[]]
+
+
+class PubSubShardQueue(object):
+    def __init__(self, topic_project_id, topic_name):
+        self.publisher = pubsub_v1.PublisherClient()
+        self.topic_path = f"projects/{topic_project_id}/topics/{topic_name}"
+
+    def publish(self, shard_message):
+        future = self.publisher.publish(
+            self.topic_path, json.dumps(shard_message).encode("utf-8")
+        )
+        future.result()
+
+
+class LocalShardQueue(object):
+    # In-process stand-in for the shard topic, e.g. for tests and local runs
+    def __init__(self):
+        self.messages = deque()
+
+    def publish(self, shard_message):
+        # Round-trip through JSON like a Pub/Sub message would
+        self.messages.append(json.loads(json.dumps(shard_message)))
+
+    def drain(self, worker):
+        results = []
+        while self.messages:
+            results.append(worker(self.messages.popleft()))
+        return results
+
+
+class ShardedRun(object):
+    def __init__(self, state_store):
+        self.state_store = state_store
+
+    def start(self, project_ids, shard_size, shard_queue, gobits, not_found_resources=None):
+        # Findings of the coordinator itself are handed to the first shard
+        run_id = uuid.uuid4().hex
+        shards = make_shards(project_ids, shard_size)
+        for shard_index, shard_project_ids in enumerate(shards):
+            shard_queue.publish(
+                {
+                    "run_id": run_id,
+                    "shard_index": shard_index,
+                    "shard_count": len(shards),
+                    "project_ids": shard_project_ids,
+                    "not_found_resources": (not_found_resources or []) if shard_index == 0 else [],
+                    "gobits": gobits,
+                }
+            )
+        logging.info(
+            f"Published {len(shards)} shards for {len(project_ids)} projects of run {run_id}"
+        )
+        return run_id
+
+    def finish_shard(self, shard_message, not_found_resources):
+        # Returns the merged findings of all shards when this shard completes the run, otherwise None
+        run_id = shard_message["run_id"]
+        shard_count = shard_message["shard_count"]
+        aggregated_name = f"shards/{run_id}/aggregated"
+        # A shard redelivered after the run was aggregated would leave a partial that is never merged or deleted
+        if self.state_store.load(aggregated_name) is not None:
+            logging.info(
+                f"Shard {shard_message['shard_index']} of run {run_id} was redelivered after the run was aggregated"
+            )
+            return None
+        self.state_store.save(
+            f"shards/{run_id}/shard-{shard_message['shard_index']:05d}.json",
+            # Shards published before the coordinator always passed its findings may carry None
+            (shard_message.get("not_found_resources") or []) + not_found_resources,
+        )
+        partials = self.state_store.list(f"shards/{run_id}/shard-")
+        if len(partials) < shard_count:
+            logging.info(
+                f"Shard {shard_message['shard_index']} of run {run_id} finished, "
+                f"{shard_count - len(partials)} shards remaining"
+            )
+            return None
+        # Redelivered shards may finish at the same time, only one of them aggregates
+        if not self.state_store.create_exclusive(aggregated_name, {}):
+            return None
+        merged = []
+        for partial in partials:
+            merged.extend(self.state_store.load(partial) or [])
+            self.state_store.delete(partial)
+        logging.info(f"Aggregated {shard_count} shards of run {run_id}")
+        return merged
@@ -0,0 +1,123 @@
+import json
+import logging
+import os
+import tempfile
+
+import config
+from google.api_core.exceptions import NotFound as GCP_NotFound
+from google.api_core.exceptions import PreconditionFailed as GCP_PreconditionFailed
+from google.cloud import storage
+
+# Name of the function the state belongs to, set by its main module
+# It is the default prefix in the STATE_BUCKET and the default local directory, so functions never share state
+FUNCTION_NAME = "functions"
+
+
+class LocalStateStore(object):
+    def __init__(self, directory):
+        self.directory = directory
+
+    def load(self, name):
+        path = os.path.join(self.directory, name)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r") as state_file:
+                return json.load(state_file)
+        except ValueError as e:
+            logging.warning(f"State file {path} could not be read: {e}")
+            return None
+
+    def save(self, name, data):
+        path = os.path.join(self.directory, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first so an interrupted run never leaves a truncated state
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as state_file:
+            json.dump(data, state_file)
+        os.replace(temp_path, path)
+
+    def create_exclusive(self, name, data):
+        # Returns False when the state already exists, so only one caller can create it
+        path = os.path.join(self.directory, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            state_fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(state_fd, "w") as state_file:
+            json.dump(data, state_file)
+        return True
+
+    def list(self, prefix):
+        directory = os.path.dirname(os.path.join(self.directory, prefix))
+        if not os.path.isdir(directory):
+            return []
+        names = [
+            os.path.relpath(os.path.join(directory, file_name), self.directory)
+            for file_name in os.listdir(directory)
+            if not file_name.endswith(".tmp")
+        ]
+        return sorted(name for name in names if name.startswith(prefix))
+
+    def delete(self, name):
+        path = os.path.join(self.directory, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class BucketStateStore(object):
+    def __init__(self, bucket_name, prefix):
+        self.prefix = prefix
+        self.stg_client = storage.Client()
+        self.bucket = self.stg_client.bucket(bucket_name)
+
+    def load(self, name):
+        try:
+            data = self.bucket.blob(f"{self.prefix}{name}").download_as_string()
+        except GCP_NotFound:
+            return None
+        try:
+            return json.loads(data)
+        except ValueError as e:
+            logging.warning(f"State object {self.prefix}{name} could not be read: {e}")
+            return None
+
+    def save(self, name, data):
+        self.bucket.blob(f"{self.prefix}{name}").upload_from_string(
+            json.dumps(data), content_type="application/json"
+        )
+
+    def create_exclusive(self, name, data):
+        # Returns False when the state already exists, so only one caller can create it
+        try:
+            self.bucket.blob(f"{self.prefix}{name}").upload_from_string(
+                json.dumps(data), content_type="application/json", if_generation_match=0
+            )
+        except GCP_PreconditionFailed:
+            return False
+        return True
+
+    def list(self, prefix):
+        return sorted(
+            blob.name[len(self.prefix):]
+            for blob in self.stg_client.list_blobs(
+                self.bucket, prefix=f"{self.prefix}{prefix}", fields="items(name),nextPageToken"
+            )
+        )
+
+    def delete(self, name):
+        try:
+            self.bucket.blob(f"{self.prefix}{name}").delete()
+        except GCP_NotFound:
+            pass
+
+
+def get_state_store():
+    # State is kept in a bucket when configured, otherwise on the local filesystem
+    bucket_name = getattr(config, "STATE_BUCKET", None)
+    if bucket_name:
+        return BucketStateStore(bucket_name, getattr(config, "STATE_PREFIX", f"{FUNCTION_NAME}/"))
+    return LocalStateStore(
+        getattr(config, "STATE_DIRECTORY", os.path.join(tempfile.gettempdir(), FUNCTION_NAME))
+    )
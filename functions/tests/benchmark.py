@@ -0,0 +1,156 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+
+try:
+    import config
+except ImportError:
+    # The benchmark does not need the configuration of a deployment
+    config = types.ModuleType("config")
+    sys.modules["config"] = config
+
+# The benchmark and its fakes are not deployed, they run the modules of check-catalog-existence and the modules
+# shared by the functions, like token_bucket.py, from the functions directory
+FUNCTIONS_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(FUNCTIONS_DIRECTORY, "check-catalog-existence"))
+sys.path.append(FUNCTIONS_DIRECTORY)
+
+
+def configure(state_directory, bidirectional, inventory_backend):
+    # Keep all state local and never throttle the fakes
+    config.DELEGATED_SA = "benchmark@benchmark.iam.gserviceaccount.com"
+    config.TOPIC_PROJECT_ID = "benchmark"
+    config.TOPIC_NAME = "benchmark-p-findings"
+    config.BIDIRECTIONAL_CHECK = bidirectional
+    config.REVERSE_TOPIC_NAME = "benchmark-p-reverse-findings"
+    config.INVENTORY_BACKEND = inventory_backend
+    config.ASSET_SCOPE = "organizations/0"
+    config.STATE_BUCKET = None
+    config.STATE_DIRECTORY = state_directory
+    config.SERVICE_CACHE_TTL_SECONDS = 0
+    config.INCREMENTAL_CHECK = False
+    config.CHECKPOINT_SCAN = False
+    config.API_QUOTAS = {
+        api: 10 ** 9
+        for api in ["bigquery", "cloudresourcemanager", "pubsub", "serviceusage", "sqladmin", "storage"]
+    }
+
+
+def make_processor(gcp_helper, gcp_inventory, ckan_inventory, recorder=None):
+    # The real CKANProcessor against the fakes, shared by the benchmark and the tests
+    from ckan_processor import CKANProcessor
+    from fakes import CallRecorder, FakeCKANService, make_gcp_clients
+    from gcp_service import GCPService
+    from scan_report import ScanReport
+
+    recorder = recorder or CallRecorder({"ckan": 0, "gcp": 0})
+    return CKANProcessor(
+        gcp_helper=gcp_helper,
+        gcp_service=GCPService(ScanReport(), clients=make_gcp_clients(gcp_inventory, recorder)),
+        ckan_service=FakeCKANService(ckan_inventory, recorder),
+    )
+
+
+def run_benchmark(projects, packages, resources, ckan_latency, gcp_latency, missing_ratio, seed):
+    from fakes import CallRecorder, FakeGCPHelper, make_inventory
+
+    gcp_inventory, ckan_inventory, missing = make_inventory(
+        projects, packages, resources, missing_ratio=missing_ratio, seed=seed
+    )
+    recorder = CallRecorder({"ckan": ckan_latency, "gcp": gcp_latency})
+    gcp_helper = FakeGCPHelper()
+    processor = make_processor(gcp_helper, gcp_inventory, ckan_inventory, recorder)
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    processor.process(None)
+    wall_seconds = time.perf_counter() - started
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    not_found = sum(
+        1
+        for resource in gcp_helper.published.get(config.TOPIC_NAME, [])
+        if resource["message"] == "Resource not found"
+    )
+    return {
+        "projects": projects,
+        "packages": projects * packages,
+        "resources": projects * packages * resources,
+        "wall_seconds": round(wall_seconds, 3),
+        "peak_memory_mb": round(peak_memory / 2 ** 20, 2),
+        "ckan_calls": sum(count for call, count in recorder.calls.items() if call.startswith("ckan.")),
+        "gcp_calls": sum(count for call, count in recorder.calls.items() if call.startswith("gcp.")),
+        "calls": dict(sorted(recorder.calls.items())),
+        "not_found": not_found,
+        "expected_not_found": missing,
+        "reverse_not_found": len(gcp_helper.published.get(config.REVERSE_TOPIC_NAME, [])),
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the catalog existence check against a fake CKAN and GCP"
+    )
+    parser.add_argument(
+        "--projects", default="10,50,100", help="Comma separated numbers of projects to sweep"
+    )
+    parser.add_argument("--packages", type=int, default=5, help="Packages per project")
+    parser.add_argument("--resources", type=int, default=4, help="Resources per package")
+    parser.add_argument("--ckan-latency-ms", type=float, default=0, help="Latency of every CKAN call")
+    parser.add_argument("--gcp-latency-ms", type=float, default=0, help="Latency of every GCP call")
+    parser.add_argument(
+        "--missing-ratio", type=float, default=0.1, help="Share of CKAN resources missing on GCP"
+    )
+    parser.add_argument(
+        "--bidirectional", action="store_true", help="Also check for GCP resources missing on CKAN"
+    )
+    parser.add_argument(
+        "--inventory-backend", default="listing", choices=["listing", "asset_inventory"],
+        help="Backend listing the GCP resources"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--verbose", action="store_true", help="Show the logging of the check")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    results = []
+    with tempfile.TemporaryDirectory() as state_directory:
+        configure(state_directory, args.bidirectional, args.inventory_backend)
+        print(f"{'projects':>8} {'resources':>9} {'wall s':>8} {'peak MB':>8} {'ckan calls':>10} "
+              f"{'gcp calls':>9} {'findings':>8}")
+        for projects in [int(value) for value in args.projects.split(",")]:
+            result = run_benchmark(
+                projects,
+                args.packages,
+                args.resources,
+                args.ckan_latency_ms / 1000,
+                args.gcp_latency_ms / 1000,
+                args.missing_ratio,
+                args.seed,
+            )
+            results.append(result)
+            print(f"{result['projects']:>8} {result['resources']:>9} {result['wall_seconds']:>8} "
+                  f"{result['peak_memory_mb']:>8} {result['ckan_calls']:>10} {result['gcp_calls']:>9} "
+                  f"{result['not_found']:>8}")
+            if result["not_found"] != result["expected_not_found"]:
+                logging.error(
+                    f"Expected {result['expected_not_found']} findings but found {result['not_found']}"
+                )
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
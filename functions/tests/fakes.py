@@ -0,0 +1,419 @@
+import random
+import threading
+import time
+from collections import Counter, namedtuple
+from types import SimpleNamespace
+
+from ckan_service import CKANService
+from ckanapi import NotFound
+from gcp_helper import GCPHelper
+
+# Fakes of the CKAN API and the GCP clients, serving a synthetic inventory with a configurable latency
+
+RESOURCE_FORMATS = [
+    "topic",
+    "subscription",
+    "blob-storage",
+    "cloudsql-instance",
+    "cloudsql-db",
+    "bigquery-dataset",
+]
+RESOURCE_SERVICES = [
+    "bigquery.googleapis.com",
+    "pubsub.googleapis.com",
+    "sqladmin.googleapis.com",
+    "storage-api.googleapis.com",
+]
+
+Named = namedtuple("Named", ["name"])
+Dataset = namedtuple("Dataset", ["dataset_id"])
+
+
+def make_inventory(
+        projects, packages_per_project, resources_per_package, missing_ratio=0.1, extra_ratio=0.1, seed=0
+):
+    # Returns the GCP inventory per project, the CKAN packages per project and the number of
+    # CKAN resources that do not exist on GCP
+    generator = random.Random(seed)
+    gcp_inventory = {}
+    ckan_inventory = {}
+    missing = 0
+    for project_index in range(projects):
+        project_id = f"benchmark-p-{project_index:05d}"
+        inventory = {resource_format: [] for resource_format in RESOURCE_FORMATS}
+        # Databases are listed per instance, so every project has an instance to hold them
+        inventory["cloudsql-instance"].append(f"{project_id}-sql")
+        packages = []
+        for package_index in range(packages_per_project):
+            package_name = f"{project_id}-package-{package_index}"
+            resources = []
+            for resource_index in range(resources_per_package):
+                resource_format = RESOURCE_FORMATS[
+                    (package_index * resources_per_package + resource_index) % len(RESOURCE_FORMATS)
+                ]
+                resource_name = f"{package_name}-{resource_format}-{resource_index}"
+                resources.append(
+                    {
+                        "id": f"{resource_name}-id",
+                        "name": resource_name,
+                        "format": resource_format,
+                        "url": f"https://console.cloud.google.com/{resource_name}",
+                    }
+                )
+                if generator.random() < missing_ratio:
+                    missing += 1
+                else:
+                    inventory[resource_format].append(resource_name)
+            packages.append(
+                {
+                    "id": f"{package_name}-id",
+                    "name": package_name,
+                    "metadata_modified": "2021-01-01T00:00:00.000000",
+                    "resources": resources,
+                }
+            )
+        # Resources on GCP that are not documented on CKAN
+        for resource_format in RESOURCE_FORMATS:
+            if generator.random() < extra_ratio:
+                inventory[resource_format].append(f"{project_id}-undocumented-{resource_format}")
+        inventory["services"] = list(RESOURCE_SERVICES)
+        gcp_inventory[project_id] = inventory
+        ckan_inventory[project_id] = packages
+    return gcp_inventory, ckan_inventory, missing
+
+
+class CallRecorder(object):
+    def __init__(self, latencies):
+        # Latency in seconds per side, either 'ckan' or 'gcp'
+        self.latencies = latencies
+        self.calls = Counter()
+        self.lock = threading.Lock()
+
+    def call(self, side, name):
+        with self.lock:
+            self.calls[f"{side}.{name}"] += 1
+        latency = self.latencies.get(side, 0)
+        if latency:
+            time.sleep(latency)
+
+
+class FakeCKANAction(object):
+    def __init__(self, ckan_inventory, recorder):
+        self.ckan_inventory = ckan_inventory
+        self.packages = {
+            package["id"]: dict(package, groups=[{"name": project_id}])
+            for project_id, packages in ckan_inventory.items()
+            for package in packages
+        }
+        self.recorder = recorder
+
+    def group_list(self):
+        self.recorder.call("ckan", "group_list")
+        return sorted(self.ckan_inventory)
+
+    def group_show(self, id, include_datasets=False):
+        self.recorder.call("ckan", "group_show")
+        if id not in self.ckan_inventory:
+            raise NotFound()
+        group = {"id": id, "name": id}
+        if include_datasets:
+            group["packages"] = [
+                {key: value for key, value in package.items() if key != "resources"}
+                for package in self.ckan_inventory[id]
+            ]
+        return group
+
+    def package_search(self, q="*:*", start=0, rows=10, sort=None, include_private=False):
+        self.recorder.call("ckan", "package_search")
+        packages = sorted(self.packages.values(), key=lambda package: package["name"])
+        return {"count": len(packages), "results": packages[start:start + rows]}
+
+    def package_show(self, id):
+        self.recorder.call("ckan", "package_show")
+        if id not in self.packages:
+            raise NotFound()
+        return self.packages[id]
+
+
+class FakeCKANService(CKANService):
+    def __init__(self, ckan_inventory, recorder):
+        self.ckan_host = "https://ckan.benchmark"
+        self.host = SimpleNamespace(action=FakeCKANAction(ckan_inventory, recorder))
+
+    def is_ckan_reachable(self):
+        return True
+
+
+class FakeGCPHelper(GCPHelper):
+    def __init__(self):
+        # Published messages per topic name
+        self.published = {}
+
+    def publish_to_topic(self, topic_project_id, topic_name, messages, gobits):
+        self.published.setdefault(topic_name, []).extend(messages)
+        return True
+
+
+class FakePubSubPager(object):
+    def __init__(self, recorder, call, items, page_size, field):
+        self.recorder = recorder
+        self.call = call
+        self.items = items
+        self.page_size = page_size or 100
+        self.field = field
+
+    @property
+    def pages(self):
+        for index in range(0, max(len(self.items), 1), self.page_size):
+            self.recorder.call("gcp", self.call)
+            yield SimpleNamespace(**{self.field: self.items[index:index + self.page_size]})
+
+
+class FakeHTTPIterator(object):
+    def __init__(self, recorder, call, items, default_page_size):
+        self.recorder = recorder
+        self.call = call
+        self.items = items
+        self.default_page_size = default_page_size
+        self.extra_params = {}
+
+    @property
+    def pages(self):
+        page_size = self.extra_params.get("maxResults", self.default_page_size)
+        for index in range(0, max(len(self.items), 1), page_size):
+            self.recorder.call("gcp", self.call)
+            yield self.items[index:index + page_size]
+
+
+class FakePublisherClient(object):
+    def __init__(self, gcp_inventory, recorder):
+        self.gcp_inventory = gcp_inventory
+        self.recorder = recorder
+
+    def list_topics(self, request):
+        project_id = request["project"].split("/")[-1]
+        topics = [
+            Named(f"{request['project']}/topics/{name}")
+            for name in self.gcp_inventory[project_id]["topic"]
+        ]
+        return FakePubSubPager(self.recorder, "pubsub.topics", topics, request.get("page_size"), "topics")
+
+
+class FakeSubscriberClient(object):
+    def __init__(self, gcp_inventory, recorder):
+        self.gcp_inventory = gcp_inventory
+        self.recorder = recorder
+
+    def list_subscriptions(self, request):
+        project_id = request["project"].split("/")[-1]
+        subscriptions = [
+            Named(f"{request['project']}/subscriptions/{name}")
+            for name in self.gcp_inventory[project_id]["subscription"]
+        ]
+        return FakePubSubPager(
+            self.recorder, "pubsub.subscriptions", subscriptions, request.get("page_size"), "subscriptions"
+        )
+
+    def close(self):
+        pass
+
+
+class FakeStorageClient(object):
+    def __init__(self, gcp_inventory, recorder):
+        self.gcp_inventory = gcp_inventory
+        self.recorder = recorder
+
+    def list_buckets(self, project, **kwargs):
+        buckets = [Named(name) for name in self.gcp_inventory[project]["blob-storage"]]
+        return FakeHTTPIterator(self.recorder, "storage.buckets", buckets, 1000)
+
+
+class FakeBigQueryClient(object):
+    def __init__(self, gcp_inventory, recorder):
+        self.gcp_inventory = gcp_inventory
+        self.recorder = recorder
+
+    def list_datasets(self, project):
+        datasets = [Dataset(name) for name in self.gcp_inventory[project]["bigquery-dataset"]]
+        return FakeHTTPIterator(self.recorder, "bigquery.datasets", datasets, 50)
+
+
+class FakeRequest(object):
+    def __init__(self, recorder, call, response, kwargs):
+        self.recorder = recorder
+        self.call = call
+        self.response = response
+        self.kwargs = kwargs
+
+    def execute(self):
+        self.recorder.call("gcp", self.call)
+        return self.response
+
+
+class FakeCollection(object):
+    # A discovery API collection without paging
+    def __init__(self, recorder, call, list_items, items_key="items", page_size_param=None):
+        self.recorder = recorder
+        self.call = call
+        self.list_items = list_items
+        self.items_key = items_key
+        self.page_size_param = page_size_param
+
+    def list(self, **kwargs):
+        return self.make_request(kwargs, 0)
+
+    def make_request(self, kwargs, start):
+        items = self.list_items(kwargs)
+        page_size = kwargs.get(self.page_size_param) or len(items) or 1
+        response = {self.items_key: items[start:start + page_size]}
+        if start + page_size < len(items):
+            response["nextPageToken"] = str(start + page_size)
+        return FakeRequest(self.recorder, self.call, response, kwargs)
+
+
+class FakePagedCollection(FakeCollection):
+    def list_next(self, previous_request, previous_response):
+        if "nextPageToken" not in previous_response:
+            return None
+        return self.make_request(previous_request.kwargs, int(previous_response["nextPageToken"]))
+
+
+class FakeDiscoveryClient(object):
+    def __init__(self, **collections):
+        self.collections = collections
+
+    def __getattr__(self, name):
+        if name not in self.collections:
+            raise AttributeError(name)
+        return lambda: self.collections[name]
+
+
+def make_asset_responses(gcp_inventory, page_size=500):
+    # Recorded searchAllResources responses for the inventory, keyed by the searched asset types
+    asset_types = {
+        "topic": ("pubsub.googleapis.com/Topic", "//pubsub.googleapis.com/projects/{project_id}/topics/{name}"),
+        "subscription": (
+            "pubsub.googleapis.com/Subscription",
+            "//pubsub.googleapis.com/projects/{project_id}/subscriptions/{name}",
+        ),
+        "blob-storage": ("storage.googleapis.com/Bucket", "//storage.googleapis.com/{name}"),
+        "cloudsql-instance": (
+            "sqladmin.googleapis.com/Instance",
+            "//cloudsql.googleapis.com/projects/{project_id}/instances/{name}",
+        ),
+        "bigquery-dataset": (
+            "bigquery.googleapis.com/Dataset",
+            "//bigquery.googleapis.com/projects/{project_id}/datasets/{name}",
+        ),
+        "services": (
+            "serviceusage.googleapis.com/Service",
+            "//serviceusage.googleapis.com/projects/{project_number}/services/{name}",
+        ),
+    }
+    project_results = []
+    resource_results = []
+    for project_index, (project_id, inventory) in enumerate(sorted(gcp_inventory.items())):
+        project_number = str(100000000000 + project_index)
+        project_results.append(
+            {
+                "name": f"//cloudresourcemanager.googleapis.com/projects/{project_number}",
+                "assetType": "cloudresourcemanager.googleapis.com/Project",
+                "project": f"projects/{project_number}",
+                "displayName": project_id,
+                "additionalAttributes": {"projectId": project_id},
+                "state": "ACTIVE",
+            }
+        )
+        for resource_format, (asset_type, name_format) in asset_types.items():
+            for name in inventory[resource_format]:
+                resource_results.append(
+                    {
+                        "name": name_format.format(
+                            project_id=project_id, project_number=project_number, name=name
+                        ),
+                        "assetType": asset_type,
+                        "project": f"projects/{project_number}",
+                        "displayName": name,
+                        "state": "ENABLED" if resource_format == "services" else "",
+                    }
+                )
+    resource_asset_types = sorted(asset_type for asset_type, _ in asset_types.values())
+    return {
+        "cloudresourcemanager.googleapis.com/Project": [
+            {"results": project_results[index:index + page_size]}
+            for index in range(0, max(len(project_results), 1), page_size)
+        ],
+        ",".join(resource_asset_types): [
+            {"results": resource_results[index:index + page_size]}
+            for index in range(0, max(len(resource_results), 1), page_size)
+        ],
+    }
+
+
+class RecordedAssetClient(object):
+    # Replays recorded responses of the Cloud Asset API, e.g. from make_asset_responses or a real recording
+    def __init__(self, recorder, responses):
+        self.recorder = recorder
+        self.responses = responses
+
+    def v1(self):
+        return self
+
+    def searchAllResources(self, scope, assetTypes, pageSize=None):
+        return self.make_request(",".join(sorted(assetTypes)), 0)
+
+    def searchAllResources_next(self, previous_request, previous_response):
+        if "nextPageToken" not in previous_response:
+            return None
+        return self.make_request(previous_request.kwargs["key"], int(previous_response["nextPageToken"]))
+
+    def make_request(self, key, page):
+        pages = self.responses[key]
+        response = dict(pages[page])
+        if page + 1 < len(pages):
+            response["nextPageToken"] = str(page + 1)
+        return FakeRequest(self.recorder, "cloudasset.search", response, {"key": key})
+
+
+def make_gcp_clients(gcp_inventory, recorder):
+    # Clients in the form GCPService expects them
+    def list_services(kwargs):
+        project_id = kwargs["parent"].split("/")[-1]
+        return [{"config": {"name": name}} for name in gcp_inventory[project_id]["services"]]
+
+    def list_instances(kwargs):
+        return [{"name": name} for name in gcp_inventory[kwargs["project"]]["cloudsql-instance"]]
+
+    def list_projects(kwargs):
+        return [{"projectId": project_id, "lifecycleState": "ACTIVE"} for project_id in gcp_inventory]
+
+    def list_databases(kwargs):
+        # All databases of a project live on its first instance
+        inventory = gcp_inventory[kwargs["project"]]
+        if kwargs["instance"] != inventory["cloudsql-instance"][0]:
+            return []
+        return [{"name": name} for name in inventory["cloudsql-db"]]
+
+    return {
+        "storage": FakeStorageClient(gcp_inventory, recorder),
+        "bigquery": FakeBigQueryClient(gcp_inventory, recorder),
+        "publisher": FakePublisherClient(gcp_inventory, recorder),
+        "subscriber": FakeSubscriberClient(gcp_inventory, recorder),
+        "serviceusage": FakeDiscoveryClient(
+            services=FakePagedCollection(
+                recorder, "serviceusage.services", list_services, "services", "pageSize"
+            )
+        ),
+        "sqladmin": FakeDiscoveryClient(
+            instances=FakePagedCollection(
+                recorder, "sqladmin.instances", list_instances, "items", "maxResults"
+            ),
+            databases=FakeCollection(recorder, "sqladmin.databases", list_databases),
+        ),
+        "cloudresourcemanager": FakeDiscoveryClient(
+            projects=FakePagedCollection(
+                recorder, "cloudresourcemanager.projects", list_projects, "projects", "pageSize"
+            )
+        ),
+        "cloudasset": RecordedAssetClient(recorder, make_asset_responses(gcp_inventory)),
+    }
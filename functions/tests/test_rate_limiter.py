@@ -0,0 +1,69 @@
+import tempfile
+import unittest
+
+from benchmark import config, configure
+
+
+class RateLimiterTest(unittest.TestCase):
+    # A 403 is only retried when it reports an exhausted quota, not when a permission is missing
+
+    def setUp(self):
+        self.state_directory = tempfile.TemporaryDirectory()
+        configure(self.state_directory.name, False, "listing")
+        config.QUOTA_MAX_RETRIES = 2
+        config.QUOTA_BACKOFF_SECONDS = 0
+
+    def tearDown(self):
+        self.state_directory.cleanup()
+
+    @staticmethod
+    def make_listing(errors):
+        # Raises the errors one by one, then lists the datasets
+        calls = []
+
+        def list_datasets():
+            calls.append(None)
+            if errors:
+                raise errors.pop(0)
+            return ["dataset"]
+
+        return list_datasets, calls
+
+    def test_bigquery_rate_limit_is_retried(self):
+        from google.api_core.exceptions import Forbidden
+        from rate_limiter import RateLimiter
+
+        # BigQuery answers an exhausted quota with a 403 and the reason in its errors
+        error = Forbidden("Exceeded rate limits", errors=[{"reason": "rateLimitExceeded", "domain": "usageLimits"}])
+        list_datasets, calls = self.make_listing([error, error])
+        rate_limiter = RateLimiter()
+
+        self.assertEqual(rate_limiter.retry("bigquery", list_datasets), ["dataset"])
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(rate_limiter.get_stats("bigquery")["throttled"], 2)
+
+    def test_exhausted_storage_quota_raises_quota_exhausted(self):
+        from google.api_core.exceptions import Forbidden
+        from rate_limiter import QuotaExhausted, RateLimiter
+
+        errors = [Forbidden("Quota exceeded", errors=[{"reason": "quotaExceeded"}]) for _ in range(3)]
+        list_buckets, calls = self.make_listing(errors)
+
+        with self.assertRaises(QuotaExhausted):
+            RateLimiter().retry("storage", list_buckets)
+        self.assertEqual(len(calls), 3)
+
+    def test_missing_permission_is_not_retried(self):
+        from google.api_core.exceptions import Forbidden
+        from rate_limiter import RateLimiter
+
+        error = Forbidden("Access denied", errors=[{"reason": "accessDenied"}])
+        list_datasets, calls = self.make_listing([error])
+
+        with self.assertRaises(Forbidden):
+            RateLimiter().retry("bigquery", list_datasets)
+        self.assertEqual(len(calls), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
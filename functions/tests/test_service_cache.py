@@ -0,0 +1,58 @@
+import tempfile
+import unittest
+
+from benchmark import config, configure, make_processor
+
+
+class ServiceCacheTest(unittest.TestCase):
+    # Checks projects whose cached services are stale, against the fakes of the benchmark
+
+    def setUp(self):
+        self.state_directory = tempfile.TemporaryDirectory()
+        configure(self.state_directory.name, False, "listing")
+        config.SERVICE_CACHE_TTL_SECONDS = 60 * 60
+
+    def tearDown(self):
+        self.state_directory.cleanup()
+
+    def test_api_enabled_after_caching(self):
+        from fakes import FakeGCPHelper, make_inventory
+
+        gcp_inventory, ckan_inventory, missing = make_inventory(1, 2, 6, missing_ratio=0.0, seed=1)
+        project_id = list(gcp_inventory)[0]
+        processor = make_processor(FakeGCPHelper(), gcp_inventory, ckan_inventory)
+        # The services were cached before Pub/Sub was enabled
+        processor.gcp_service.service_cache.put(
+            project_id,
+            [service for service in gcp_inventory[project_id]["services"] if service != "pubsub.googleapis.com"],
+        )
+
+        self.assertEqual(processor.process_project(project_id), [])
+        self.assertIn("pubsub.googleapis.com", processor.gcp_service.get_project_services(project_id))
+
+    def test_forbidden_listing_is_skipped(self):
+        from fakes import FakeGCPHelper, make_inventory
+        from google.api_core.exceptions import Forbidden
+
+        gcp_inventory, ckan_inventory, missing = make_inventory(1, 2, 6, missing_ratio=0.5, seed=1)
+        project_id = list(gcp_inventory)[0]
+        expected = [
+            resource["resource_name"]
+            for resource in make_processor(FakeGCPHelper(), gcp_inventory, ckan_inventory).process_project(project_id)
+            if resource["type"] != "blob-storage"
+        ]
+        processor = make_processor(FakeGCPHelper(), gcp_inventory, ckan_inventory)
+
+        def list_buckets(project, **kwargs):
+            raise Forbidden("Storage API has not been used in this project")
+
+        processor.gcp_service.clients["storage"].list_buckets = list_buckets
+        not_found_resources = processor.process_project(project_id)
+        # The buckets are unknown, so none of them is reported, the other types are still compared
+        self.assertEqual([resource["resource_name"] for resource in not_found_resources], expected)
+        self.assertTrue(expected)
+        self.assertIsNone(processor.gcp_service.service_cache.get(project_id))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import tempfile
+import unittest
+
+from benchmark import config, configure, make_processor
+
+
+class ShardedRunTest(unittest.TestCase):
+    # Drives a sharded run through the in-process queue, against the fakes of the benchmark
+
+    def setUp(self):
+        self.state_directory = tempfile.TemporaryDirectory()
+        configure(self.state_directory.name, False, "listing")
+        config.SHARD_SIZE = 2
+
+    def tearDown(self):
+        self.state_directory.cleanup()
+
+    def test_coordinate_drain_and_process_shards(self):
+        from fakes import FakeGCPHelper, make_inventory
+        from sharding import LocalShardQueue
+
+        gcp_inventory, ckan_inventory, missing = make_inventory(5, 2, 3, missing_ratio=0.2, seed=1)
+        gcp_helper = FakeGCPHelper()
+        shard_queue = LocalShardQueue()
+
+        self.assertTrue(
+            make_processor(gcp_helper, gcp_inventory, ckan_inventory).coordinate(None, shard_queue)
+        )
+        self.assertEqual(len(shard_queue.messages), 3)
+        self.assertEqual(shard_queue.messages[0]["not_found_resources"], [])
+
+        # Every shard is checked by a worker of its own, like the shard function would
+        results = shard_queue.drain(
+            lambda shard_message: make_processor(
+                gcp_helper, gcp_inventory, ckan_inventory
+            ).process_shard(shard_message)
+        )
+        self.assertEqual(len(results), 3)
+        published = gcp_helper.published[config.TOPIC_NAME]
+        self.assertEqual(
+            len([resource for resource in published if resource["message"] == "Resource not found"]), missing
+        )
+
+    def test_finish_shard_without_coordinator_findings(self):
+        from sharding import ShardedRun
+        from state_store import LocalStateStore
+
+        shard_message = {"run_id": "run", "shard_index": 0, "shard_count": 1, "not_found_resources": None}
+        merged = ShardedRun(LocalStateStore(self.state_directory.name)).finish_shard(
+            shard_message, [{"message": "Resource not found"}]
+        )
+        self.assertEqual(merged, [{"message": "Resource not found"}])
+
+
+    def test_shard_redelivered_after_aggregation(self):
+        from sharding import ShardedRun
+        from state_store import LocalStateStore
+
+        state_store = LocalStateStore(self.state_directory.name)
+        shard_message = {"run_id": "run", "shard_index": 0, "shard_count": 1, "not_found_resources": []}
+        self.assertEqual(ShardedRun(state_store).finish_shard(shard_message, []), [])
+
+        # The redelivered shard neither publishes the findings again nor leaves a partial behind
+        self.assertIsNone(ShardedRun(state_store).finish_shard(shard_message, [{"message": "Resource not found"}]))
+        self.assertEqual(state_store.list("shards/run/shard-"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,30 @@
+import threading
+import time
+
+
+class TokenBucket(object):
+    # Limits requests to a number per minute, shared by the functions that throttle their API requests
+
+    def __init__(self, requests_per_minute):
+        # Bursts of up to a sixth of the limit, refilled at the rest of it
+        # A burst plus a minute of refill is never more than the limit, so no minute exceeds it
+        self.capacity = max(1.0, requests_per_minute / 6.0)
+        self.rate = max(1.0, requests_per_minute - self.capacity) / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        # Blocks until a token is available, returns the seconds waited
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait